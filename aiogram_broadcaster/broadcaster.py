@@ -1,22 +1,37 @@
+from asyncio import CancelledError, Semaphore, create_task, gather, sleep
 from collections.abc import Iterable
-from typing import Any, Optional
+from contextlib import suppress
+from functools import partial
+from typing import TYPE_CHECKING, Any, Optional, Union
 
 from aiogram import Bot, Dispatcher, F
 from magic_filter import MagicFilter
 from pydantic import JsonValue
 from typing_extensions import Self
 
+from aiogram_broadcaster.utils.id_generator import generate_id
 from aiogram_broadcaster.utils.logger import logger
+from aiogram_broadcaster.utils.rate_limiter import RateLimiter
 
 from .contents.base import ContentType
 from .event.manager import EventManager
 from .intervals.base import BaseInterval
+from .mailer.checkpoint import CheckpointPolicy
 from .mailer.container import MailerContainer
+from .mailer.flusher import FlushPolicy, StateFlusher
 from .mailer.group import MailerGroup
 from .mailer.mailer import Mailer
 from .mailer.status import MailerStatus
 from .placeholder.manager import PlaceholderManager
-from .storages.base import BaseStorage
+from .storages.base import BaseStorage, StorageRecord, StorageStub
+
+
+if TYPE_CHECKING:
+    from asyncio import Task
+    from collections.abc import AsyncIterable
+
+
+DEFAULT_RESTORE_CONCURRENCY = 10
 
 
 class Broadcaster(MailerContainer):
@@ -24,18 +39,33 @@ class Broadcaster(MailerContainer):
         self,
         *bots: Bot,
         storage: Optional[BaseStorage] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        checkpoint: Optional[CheckpointPolicy] = None,
+        lazy_restore: bool = False,
+        lease_timeout: Optional[float] = None,
+        flush: Optional[FlushPolicy] = None,
         **context: Any,
     ) -> None:
+        if lease_timeout is not None and lease_timeout <= 0:
+            raise ValueError("Lease timeout must be positive.")
         super().__init__()
 
         self.bots = bots
         self.storage = storage
+        self.rate_limiter = rate_limiter
+        self.checkpoint = checkpoint or CheckpointPolicy()
+        self.flusher = StateFlusher(storage=storage, policy=flush) if storage and flush else None
+        self.lazy_restore = lazy_restore
+        self.lease_timeout = lease_timeout
+        self.owner_id = generate_id()
         self.context = context
         self.context["bots"] = self.bots
 
         self.event = EventManager(name="root")
         self.placeholder = PlaceholderManager(name="root")
 
+        self._failover_task: Optional[Task[None]] = None
+
     def get_mailers(self, magic: Optional[MagicFilter] = None) -> MailerGroup:
         mailers = list(filter(magic.resolve, self)) if magic else list(self)
         return MailerGroup(*mailers)
@@ -46,6 +76,8 @@ class Broadcaster(MailerContainer):
         chats: Iterable[int],
         content: ContentType,
         interval: Optional[BaseInterval] = None,
+        concurrency: int = 1,
+        compact_chats: bool = False,
         **context: JsonValue,
     ) -> MailerGroup[ContentType]:
         if not bots and not self.bots:
@@ -57,6 +89,8 @@ class Broadcaster(MailerContainer):
                 content=content,
                 bot=bot,
                 interval=interval,
+                concurrency=concurrency,
+                compact_chats=compact_chats,
                 **context,
             )
             for bot in bots
@@ -69,6 +103,9 @@ class Broadcaster(MailerContainer):
         content: ContentType,
         bot: Optional[Bot] = None,
         interval: Optional[BaseInterval] = None,
+        *,
+        concurrency: int = 1,
+        compact_chats: bool = False,
         **context: JsonValue,
     ) -> Mailer[ContentType]:
         return await Mailer.create(
@@ -77,25 +114,88 @@ class Broadcaster(MailerContainer):
             content=content,
             bot=bot,
             interval=interval,
+            concurrency=concurrency,
+            compact_chats=compact_chats,
             **context,
         )
 
-    async def restore_mailers(self) -> None:
+    async def restore_mailers(self, concurrency: int = DEFAULT_RESTORE_CONCURRENCY) -> None:
         if not self.storage:
             raise ValueError("Storage not found.")
-        async for mailer_id, record in self.storage.get_records():
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least one.")
+        semaphore = Semaphore(value=concurrency)
+        tasks: set[Task[None]] = set()
+        records: AsyncIterable[tuple[int, Union[StorageRecord, StorageStub]]] = (
+            self.storage.get_stubs()
+            if self.lazy_restore or self.storage.chat_queue
+            else self.storage.get_records()
+        )
+        async for mailer_id, record in records:
+            await semaphore.acquire()
+            task = create_task(
+                coro=self._restore_mailer(
+                    semaphore=semaphore,
+                    mailer_id=mailer_id,
+                    record=record,
+                ),
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await gather(*tasks)
+
+    async def run_mailers(self) -> None:
+        self._start_mailers(group=self.get_mailers(magic=F.status.is_(MailerStatus.STOPPED)))
+        if self.storage and self.lease_timeout is not None and not self._failover_task:
+            self._failover_task = create_task(coro=self._failover_mailers(self.lease_timeout))
+
+    async def shutdown(self) -> None:
+        if self._failover_task:
+            self._failover_task.cancel()
+            with suppress(CancelledError):
+                await self._failover_task
+            self._failover_task = None
+        if self.flusher:
+            await self.flusher.close()
+
+    async def _failover_mailers(self, interval: float) -> None:
+        while True:
+            await sleep(interval)
             try:
+                self._start_mailers(group=self.get_mailers(magic=F.awaiting_lease & F.can_started))
+            except Exception:
+                logger.exception("Failed to fail over mailers.")
+
+    def _start_mailers(self, group: MailerGroup) -> None:
+        for mailer, task in group.start().items():
+            if isinstance(task, BaseException):
+                logger.error("Failed to start mailer id=%d.", mailer.id, exc_info=task)
+            else:
+                task.add_done_callback(partial(self._log_start_error, mailer.id))
+
+    def _log_start_error(self, mailer_id: int, task: "Task[bool]") -> None:
+        if not task.cancelled() and (error := task.exception()):
+            logger.error("Failed to start mailer id=%d.", mailer_id, exc_info=error)
+
+    async def _restore_mailer(
+        self,
+        semaphore: Semaphore,
+        mailer_id: int,
+        record: Union[StorageRecord, StorageStub],
+    ) -> None:
+        try:
+            if isinstance(record, StorageStub):
+                await Mailer.create_from_stub(broadcaster=self, mailer_id=mailer_id, stub=record)
+            else:
                 await Mailer.create_from_record(
                     broadcaster=self,
                     mailer_id=mailer_id,
                     record=record,
                 )
-            except Exception:
-                logger.exception("Failed to restore mailer id=%d.", mailer_id)
-
-    async def run_mailers(self) -> None:
-        group = self.get_mailers(magic=F.status.is_(MailerStatus.STOPPED))
-        group.start()
+        except Exception:
+            logger.exception("Failed to restore mailer id=%d.", mailer_id)
+        finally:
+            semaphore.release()
 
     def setup(
         self,
@@ -111,6 +211,7 @@ class Broadcaster(MailerContainer):
         self.context["dispatcher"] = dispatcher
         if fetch_dispatcher_context:
             self.context.update(dispatcher.workflow_data)
+        dispatcher.shutdown.register(callback=self.shutdown)
         if self.storage:
             dispatcher.startup.register(callback=self.storage.startup)
             dispatcher.shutdown.register(callback=self.storage.shutdown)
@@ -7,7 +7,7 @@ class EventManager(Event):
     __chain_root__ = True
 
     async def emit_event(self, event_name: str, /, **context: Any) -> None:
-        for event in self.chain_tail:
+        for event in self.chain_snapshot:
             for handler in event.observers[event_name].handlers:
                 filter_result, filter_data = await handler.check(**context)
                 if not filter_result:
@@ -22,7 +22,7 @@ class PeriodInterval(BaseInterval):
         return cls(period=delta.total_seconds())
 
     async def __call__(self, mailer: Mailer) -> float:
-        return self.period / len(mailer.chats.total)
+        return self.period / sum(mailer.counters.values())
 
     if TYPE_CHECKING:
 
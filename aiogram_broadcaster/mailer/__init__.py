@@ -1,8 +1,12 @@
 __all__ = (
+    "CheckpointPolicy",
+    "FlushPolicy",
     "Mailer",
     "MailerStatus",
 )
 
 
+from .checkpoint import CheckpointPolicy
+from .flusher import FlushPolicy
 from .mailer import Mailer
 from .status import MailerStatus
@@ -1,17 +1,40 @@
+from array import array
+from bisect import bisect_left
 from collections import defaultdict
-from collections.abc import Iterable, Iterator
-from dataclasses import dataclass
+from collections.abc import Collection, Iterable, Iterator, MutableSet
 from enum import IntEnum, auto
+from heapq import merge
+from itertools import chain, islice
 from math import inf
-from typing import SupportsInt
-
-from pydantic import BaseModel, ConfigDict
+from typing import Annotated, Any, SupportsInt, Union
+
+from pydantic import (
+    BaseModel,
+    BeforeValidator,
+    ConfigDict,
+    Field,
+    GetCoreSchemaHandler,
+    PlainSerializer,
+    model_validator,
+)
+from pydantic_core import CoreSchema, core_schema
 from typing_extensions import Self
 
+from aiogram_broadcaster.utils.packing import pack_ids, unpack_ids
+
+
+BUFFER_MIN_SIZE = 1024
+BUFFER_RATIO = 8
+
 
-@dataclass(frozen=True)
 class ChatsMetric:
-    ids: set[int]
+    def __init__(
+        self,
+        ids: Collection[int] = (),
+        *,
+        sources: tuple[Collection[int], ...] = (),
+    ) -> None:
+        self.sources = (ids, *sources) if ids else sources
 
     def __str__(self) -> str:
         return str(len(self))
@@ -19,17 +42,24 @@ class ChatsMetric:
     def __repr__(self) -> str:
         return f"ChatsMetric(total={len(self)})"
 
-    def __iter__(self) -> Iterator[int]:
+    def __iter__(self) -> Iterator[int]:  # Over a snapshot, the sources may change meanwhile
         return iter(self.ids)
 
     def __contains__(self, item: int) -> bool:
-        return item in self.ids
+        return any(item in source for source in self.sources)
 
     def __bool__(self) -> bool:
-        return bool(self.ids)
+        return any(self.sources)
 
     def __len__(self) -> int:
-        return len(self.ids)
+        return sum(map(len, self.sources))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChatsMetric):
+            return NotImplemented
+        return len(self) == len(other) and self.ids == other.ids
+
+    __hash__ = None  # type: ignore[assignment]
 
     def __index__(self) -> int:
         return len(self)
@@ -61,6 +91,10 @@ class ChatsMetric:
     def __add__(self, other: SupportsInt) -> float:  # Same as average
         return self.average(other=other)
 
+    @property
+    def ids(self) -> set[int]:
+        return set().union(*self.sources)
+
     def ratio(self, other: SupportsInt) -> float:
         if int(other) == 0:
             return inf
@@ -79,10 +113,140 @@ class ChatState(IntEnum):
     SUCCESS = auto()
 
 
+class CompactChatSet(MutableSet[int]):
+    def __init__(self, iterable: Iterable[int] = ()) -> None:
+        self._chats = array("q", sorted(set(iterable)))
+        self._added: set[int] = set()
+        self._removed: set[int] = set()
+
+    def __repr__(self) -> str:
+        return f"CompactChatSet(total={len(self)})"
+
+    @classmethod
+    def from_sorted(cls, chats: "array[int]") -> Self:
+        compact_chat_set = cls()
+        compact_chat_set._chats = chats  # noqa: SLF001
+        return compact_chat_set
+
+    def __contains__(self, item: object) -> bool:
+        if item in self._added:
+            return True
+        if not isinstance(item, int) or item in self._removed:
+            return False
+        index = bisect_left(self._chats, item)
+        return index < len(self._chats) and self._chats[index] == item
+
+    def __iter__(self) -> Iterator[int]:
+        if self._removed:
+            chats: Iterable[int] = (chat for chat in self._chats if chat not in self._removed)
+        else:
+            chats = self._chats
+        return chain(chats, self._added)
+
+    def __len__(self) -> int:
+        return len(self._chats) - len(self._removed) + len(self._added)
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls,
+        source_type: Any,
+        handler: GetCoreSchemaHandler,
+    ) -> CoreSchema:
+        return core_schema.is_instance_schema(
+            cls=cls,
+            serialization=core_schema.plain_serializer_function_ser_schema(function=list),
+        )
+
+    def add(self, value: int) -> None:
+        if value in self:
+            return
+        if value in self._removed:
+            self._removed.remove(value)
+            return
+        self._added.add(value)
+        if len(self._added) > self._buffer_size:
+            self.compact()
+
+    def discard(self, value: int) -> None:
+        if value in self._added:
+            self._added.remove(value)
+            return
+        if value not in self:
+            return
+        self._removed.add(value)
+        if len(self._removed) > self._buffer_size:
+            self.compact()
+
+    def pop(self) -> int:
+        if self._added:
+            return self._added.pop()
+        while self._chats:
+            chat = self._chats.pop()
+            if chat not in self._removed:
+                return chat
+            self._removed.remove(chat)
+        raise KeyError("pop from an empty set")
+
+    def peek(self, count: int) -> list[int]:  # In the same order as pop()
+        added = list(islice(self._added, count))
+        chats = (chat for chat in reversed(self._chats) if chat not in self._removed)
+        return [*added, *islice(chats, count - len(added))]
+
+    def update(self, *others: Iterable[int]) -> None:
+        for other in others:
+            for chat in other:
+                self.add(chat)
+
+    def difference_update(self, *others: Iterable[int]) -> None:
+        for other in others:
+            for chat in other:
+                self.discard(chat)
+
+    def copy(self) -> "CompactChatSet":
+        return CompactChatSet(self)
+
+    def compact(self) -> None:
+        chats: Iterable[int] = self._chats
+        if self._removed:
+            chats = (chat for chat in chats if chat not in self._removed)
+        self._chats = array("q", merge(chats, sorted(self._added)))
+        self._added.clear()
+        self._removed.clear()
+
+    @property
+    def _buffer_size(self) -> int:
+        return max(BUFFER_MIN_SIZE, len(self._chats) // BUFFER_RATIO)
+
+
+def unpack_chat_set(value: Any) -> Any:
+    if isinstance(value, str):
+        return CompactChatSet.from_sorted(chats=unpack_ids(data=value))
+    return value
+
+
+def pack_chat_set(value: Union[CompactChatSet, set[int]]) -> Union[str, list[int]]:
+    if isinstance(value, CompactChatSet):
+        return pack_ids(ids=value)
+    return list(value)
+
+
+ChatSet = Annotated[
+    Union[CompactChatSet, set[int]],
+    BeforeValidator(unpack_chat_set),
+    PlainSerializer(pack_chat_set, when_used="json"),
+    Field(default_factory=set),
+]
+
+
+def create_registry() -> defaultdict[ChatState, ChatSet]:
+    return defaultdict(set)
+
+
 class Chats(BaseModel):
     model_config = ConfigDict(validate_assignment=True)
 
-    registry: defaultdict[ChatState, set[int]]
+    registry: defaultdict[ChatState, ChatSet] = Field(default_factory=create_registry)
+    compact: bool = False
 
     def __str__(self) -> str:
         metrics = [f"{metric_name}={len(metric)}" for metric_name, metric in self.metrics.items()]
@@ -90,33 +254,48 @@ class Chats(BaseModel):
         return f"Chats({metrics_string})"
 
     @classmethod
-    def from_iterable(cls, iterable: Iterable[int]) -> Self:
-        return cls(registry={ChatState.PENDING: set(iterable)})
+    def from_iterable(cls, iterable: Iterable[int], *, compact: bool = False) -> Self:
+        chats = CompactChatSet(iterable) if compact else set(iterable)
+        return cls(registry={ChatState.PENDING: chats}, compact=compact)
+
+    @model_validator(mode="after")
+    def _compact_registry(self) -> Self:
+        if self.compact:
+            for state in ChatState:
+                if not isinstance(self.registry[state], CompactChatSet):
+                    self.registry[state] = CompactChatSet(self.registry[state])
+        return self
+
+    def mark(self, state: ChatState, chats: Iterable[int]) -> None:
+        chats = set(chats)
+        for chats_state in ChatState:
+            if chats_state is not state:
+                self.registry[chats_state].difference_update(chats)
+        self.registry[state].update(chats)
 
     @property
     def total(self) -> ChatsMetric:
-        chats = set().union(*(self.registry[state] for state in ChatState))
-        return ChatsMetric(ids=chats)
+        return self._build_metric(*ChatState)
 
     @property
     def processed(self) -> ChatsMetric:
-        chats = set().union(self.registry[ChatState.FAILED], self.registry[ChatState.SUCCESS])
-        return ChatsMetric(ids=chats)
+        return self._build_metric(ChatState.FAILED, ChatState.SUCCESS)
 
     @property
     def pending(self) -> ChatsMetric:
-        chats = self.registry[ChatState.PENDING].copy()
-        return ChatsMetric(ids=chats)
+        return self._build_metric(ChatState.PENDING)
 
     @property
     def failed(self) -> ChatsMetric:
-        chats = self.registry[ChatState.FAILED].copy()
-        return ChatsMetric(ids=chats)
+        return self._build_metric(ChatState.FAILED)
 
     @property
     def success(self) -> ChatsMetric:
-        chats = self.registry[ChatState.SUCCESS].copy()
-        return ChatsMetric(ids=chats)
+        return self._build_metric(ChatState.SUCCESS)
+
+    @property
+    def counters(self) -> dict[ChatState, int]:
+        return {state: len(self.registry[state]) for state in ChatState}
 
     @property
     def metrics(self) -> dict[str, ChatsMetric]:
@@ -127,3 +306,6 @@ class Chats(BaseModel):
             "failed": self.failed,
             "success": self.success,
         }
+
+    def _build_metric(self, *states: ChatState) -> ChatsMetric:
+        return ChatsMetric(sources=tuple(self.registry[state] for state in states))
@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class CheckpointPolicy:
+    sends: int = 1
+    interval: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        if self.sends < 1:
+            raise ValueError("Sends must be at least one.")
+        if self.interval is not None and self.interval < 0:
+            raise ValueError("Interval must be non-negative.")
+
+    def is_due(self, unsaved: int, elapsed: float) -> bool:
+        if unsaved >= self.sends:
+            return True
+        return self.interval is not None and elapsed >= self.interval
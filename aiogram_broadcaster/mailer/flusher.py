@@ -0,0 +1,149 @@
+from asyncio import CancelledError, Event, Lock, create_task
+from collections import defaultdict
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from aiogram_broadcaster.utils.logger import logger
+from aiogram_broadcaster.utils.sleep import sleep
+
+from .chats import ChatState
+
+
+if TYPE_CHECKING:
+    from asyncio import Task
+
+    from aiogram_broadcaster.storages.base import BaseStorage
+
+
+@dataclass(frozen=True)
+class FlushPolicy:
+    batch_size: int = 1000
+    interval: float = 1.0
+    max_pending: int = 10_000
+
+    def __post_init__(self) -> None:
+        if self.batch_size < 1:
+            raise ValueError("Batch size must be at least one.")
+        if self.interval <= 0:
+            raise ValueError("Interval must be positive.")
+        if self.max_pending < self.batch_size:
+            raise ValueError("Max pending must be at least the batch size.")
+
+
+class StateFlusher:
+    def __init__(self, storage: "BaseStorage", policy: FlushPolicy) -> None:
+        self.storage = storage
+        self.policy = policy
+        self._pending: dict[int, dict[int, ChatState]] = {}
+        self._locks: dict[int, Lock] = {}
+        self._discarded: set[int] = set()
+        self._size = 0
+        self._flush_lock: Optional[Lock] = None
+        self._wakeup_event: Optional[Event] = None
+        self._drained_event: Optional[Event] = None
+        self._task: Optional[Task[None]] = None
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def flush_lock(self) -> Lock:
+        if not self._flush_lock:
+            self._flush_lock = Lock()
+        return self._flush_lock
+
+    @property
+    def wakeup_event(self) -> Event:
+        if not self._wakeup_event:
+            self._wakeup_event = Event()
+        return self._wakeup_event
+
+    @property
+    def drained_event(self) -> Event:
+        if not self._drained_event:
+            self._drained_event = Event()
+        return self._drained_event
+
+    async def submit(self, mailer_id: int, transitions: dict[int, ChatState], lock: Lock) -> None:
+        if not transitions:
+            return
+        if not self._task:
+            self._task = create_task(coro=self._flush_periodically())
+        while self._size >= self.policy.max_pending:
+            self.drained_event.clear()
+            self.wakeup_event.set()
+            await self.drained_event.wait()
+        self._merge(mailer_id=mailer_id, transitions=transitions)
+        self._locks[mailer_id] = lock
+        if self._size >= self.policy.batch_size:
+            self.wakeup_event.set()
+
+    def discard(self, mailer_id: int) -> None:
+        self._discarded.add(mailer_id)  # Skipped by a flush that already took its states.
+        transitions = self._pending.pop(mailer_id, {})
+        self._locks.pop(mailer_id, None)
+        self._size -= len(transitions)
+
+    async def flush(self) -> None:
+        async with self.flush_lock:
+            pending, self._pending = self._pending, {}
+            locks, self._locks = self._locks, {}
+            self._discarded.clear()
+            self._size = 0
+            try:
+                while pending:
+                    mailer_id, transitions = next(iter(pending.items()))
+                    async with locks[mailer_id]:
+                        if mailer_id not in self._discarded:
+                            await self._write(mailer_id=mailer_id, transitions=transitions)
+                    del pending[mailer_id]
+            except:
+                for mailer_id, transitions in pending.items():
+                    if mailer_id in self._discarded:
+                        continue
+                    self._merge(mailer_id=mailer_id, transitions=transitions, newer=False)
+                    self._locks.setdefault(mailer_id, locks[mailer_id])
+                raise
+            finally:
+                self.drained_event.set()
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+
+    def _merge(
+        self,
+        mailer_id: int,
+        transitions: dict[int, ChatState],
+        *,
+        newer: bool = True,
+    ) -> None:
+        pending = self._pending.setdefault(mailer_id, {})
+        self._size -= len(pending)
+        if newer:
+            pending.update(transitions)
+        else:
+            self._pending[mailer_id] = pending = {**transitions, **pending}
+        self._size += len(pending)
+
+    async def _write(self, mailer_id: int, transitions: dict[int, ChatState]) -> None:
+        states: defaultdict[ChatState, list[int]] = defaultdict(list)
+        for chat, state in transitions.items():
+            states[state].append(chat)
+        for state, chats in states.items():
+            await self.storage.mark_chats(mailer_id=mailer_id, state=state, chats=chats)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await sleep(self.wakeup_event, self.policy.interval)
+            self.wakeup_event.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush the chat states.")
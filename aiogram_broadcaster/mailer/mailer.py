@@ -1,46 +1,70 @@
-from asyncio import Event, Task, create_task
+from asyncio import CancelledError, Event, Lock, Task, create_task, gather, sleep
+from collections import defaultdict
 from collections.abc import Iterable
+from contextlib import suppress
 from dataclasses import dataclass
+from itertools import islice
+from time import monotonic
 from typing import TYPE_CHECKING, Any, Generic, Optional, cast
 
 from aiogram import Bot
-from aiogram.exceptions import TelegramAPIError
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
 from pydantic import JsonValue
 from typing_extensions import Self
 
 from aiogram_broadcaster.contents.base import ContentType
 from aiogram_broadcaster.intervals.base import BaseInterval
-from aiogram_broadcaster.storages.base import StorageRecord
+from aiogram_broadcaster.storages.base import StorageRecord, StorageStub
 from aiogram_broadcaster.utils.exceptions import (
+    MailerChatsError,
     MailerDeleteError,
     MailerExtendError,
+    MailerHydrateError,
     MailerResetError,
     MailerStartError,
     MailerStopError,
 )
 from aiogram_broadcaster.utils.id_generator import generate_id
 from aiogram_broadcaster.utils.logger import logger
+from aiogram_broadcaster.utils.sleep import sleep as sleep_until
 
-from .chats import Chats, ChatState
+from .chats import Chats, ChatState, CompactChatSet
 from .status import MailerStatus
 
 
 if TYPE_CHECKING:
     from aiogram_broadcaster.broadcaster import Broadcaster
+    from aiogram_broadcaster.placeholder.manager import PlaceholderItems
+    from aiogram_broadcaster.storages.base import BaseStorage
+
+
+LEASE_RENEWAL_RATIO = 3
+CLAIM_POLL_RATIO = 4
+MAX_CLAIM_POLL_INTERVAL = 1.0
 
 
 @dataclass
 class Mailer(Generic[ContentType]):
     id: int
     status: MailerStatus
-    chats: Chats
-    content: ContentType
-    interval: Optional[BaseInterval]
+    concurrency: int
     bot: Bot
     context: dict[str, Any]
     broadcaster: "Broadcaster"
+    _chats: Optional[Chats]
+    _content: Optional[ContentType]
+    _interval: Optional[BaseInterval]
+    _counters: dict[ChatState, int]
     _stop_event: Event
     _deleted: bool
+    _starting: bool
+    _unsaved: dict[int, ChatState]
+    _claimed: list[int]
+    _awaiting_lease: bool
+    _lease_task: Optional[Task[None]]
+    _placeholders: Optional["PlaceholderItems"]
+    _preserved_at: float
+    _preserve_lock: Lock
 
     @classmethod
     async def create(
@@ -50,28 +74,44 @@ class Mailer(Generic[ContentType]):
         content: ContentType,
         bot: Optional[Bot] = None,
         interval: Optional[BaseInterval] = None,
+        *,
+        concurrency: int = 1,
+        compact_chats: bool = False,
         **context: JsonValue,
     ) -> Self:
         if not chats:
             raise ValueError("At least one chat must be provided.")
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least one.")
         if not bot and not broadcaster.bots:
             raise ValueError("At least one bot must be provided.")
         mailer_id = generate_id(container=broadcaster)
-        chats_ = Chats.from_iterable(iterable=chats)
+        chats_ = Chats.from_iterable(iterable=chats, compact=compact_chats)
+        chat_queue = bool(broadcaster.storage and broadcaster.storage.chat_queue)
         bot = bot or broadcaster.bots[-1]
         stop_event = Event()
         stop_event.set()
         mailer = cls(
             id=mailer_id,
             status=MailerStatus.STOPPED,
-            chats=chats_,
-            content=content,
-            interval=interval,
+            concurrency=concurrency,
             bot=bot,
             context=context.copy(),
             broadcaster=broadcaster,
+            _chats=None if chat_queue else chats_,
+            _content=content,
+            _interval=interval,
+            _counters=chats_.counters if chat_queue else {},
             _stop_event=stop_event,
             _deleted=False,
+            _starting=False,
+            _unsaved={},
+            _claimed=[],
+            _awaiting_lease=False,
+            _lease_task=None,
+            _placeholders=None,
+            _preserved_at=monotonic(),
+            _preserve_lock=Lock(),
         )
         mailer.context.update(
             broadcaster.context,
@@ -82,6 +122,7 @@ class Mailer(Generic[ContentType]):
             chats=chats_,
             content=content,
             interval=interval,
+            concurrency=concurrency,
             bot_id=bot.id,
             context=context,
         )
@@ -98,32 +139,67 @@ class Mailer(Generic[ContentType]):
         broadcaster: "Broadcaster",
         mailer_id: int,
         record: StorageRecord,
+    ) -> Self:
+        return await cls._restore(
+            broadcaster=broadcaster,
+            mailer_id=mailer_id,
+            stub=StorageStub.from_record(record=record),
+            record=record,
+        )
+
+    @classmethod
+    async def create_from_stub(
+        cls,
+        broadcaster: "Broadcaster",
+        mailer_id: int,
+        stub: StorageStub,
+    ) -> Self:
+        return await cls._restore(broadcaster=broadcaster, mailer_id=mailer_id, stub=stub)
+
+    @classmethod
+    async def _restore(
+        cls,
+        broadcaster: "Broadcaster",
+        mailer_id: int,
+        stub: StorageStub,
+        record: Optional[StorageRecord] = None,
     ) -> Self:
         try:
-            bot = {bot.id: bot for bot in broadcaster.bots}[record.bot_id]
+            bot = {bot.id: bot for bot in broadcaster.bots}[stub.bot_id]
         except KeyError as error:
             raise LookupError(
-                f"Mailer id {mailer_id} could not find bot with id {record.bot_id}, "
+                f"Mailer id {mailer_id} could not find bot with id {stub.bot_id}, "
                 f"add the bot instance to Broadcaster.",
             ) from error
         status = (
             MailerStatus.STOPPED
-            if record.chats.registry[ChatState.PENDING]
+            if stub.counters.get(ChatState.PENDING)
             else MailerStatus.COMPLETED
         )
+        chat_queue = bool(broadcaster.storage and broadcaster.storage.chat_queue)
         stop_event = Event()
         stop_event.set()
         mailer = cls(
             id=mailer_id,
             status=status,
-            chats=record.chats,
-            content=cast("ContentType", record.content),
-            interval=record.interval,
+            concurrency=stub.concurrency,
             bot=bot,
-            context=record.context.copy(),
+            context=stub.context.copy(),
             broadcaster=broadcaster,
+            _chats=record.chats if record and not chat_queue else None,
+            _content=cast("ContentType", record.content) if record else None,
+            _interval=record.interval if record else None,
+            _counters={} if record and not chat_queue else stub.counters,
             _stop_event=stop_event,
             _deleted=False,
+            _starting=False,
+            _unsaved={},
+            _claimed=[],
+            _awaiting_lease=False,
+            _lease_task=None,
+            _placeholders=None,
+            _preserved_at=monotonic(),
+            _preserve_lock=Lock(),
         )
         mailer.context.update(
             broadcaster.context,
@@ -146,6 +222,40 @@ class Mailer(Generic[ContentType]):
             return NotImplemented
         return hash(self) == hash(other)
 
+    @property
+    def chats(self) -> Chats:
+        if self._chat_queue:
+            raise MailerChatsError(mailer_id=self.id)
+        if self._chats is None:
+            raise MailerHydrateError(mailer_id=self.id)
+        return self._chats
+
+    @property
+    def content(self) -> ContentType:
+        if self._content is None:
+            raise MailerHydrateError(mailer_id=self.id)
+        return self._content
+
+    @property
+    def interval(self) -> Optional[BaseInterval]:
+        if not self.hydrated:
+            raise MailerHydrateError(mailer_id=self.id)
+        return self._interval
+
+    @property
+    def hydrated(self) -> bool:
+        return self._content is not None
+
+    @property
+    def awaiting_lease(self) -> bool:
+        return self._awaiting_lease
+
+    @property
+    def counters(self) -> dict[ChatState, int]:
+        if self._chats is None:
+            return self._counters.copy()
+        return self._chats.counters
+
     @property
     def can_deleted(self) -> bool:
         return not self._deleted
@@ -156,7 +266,7 @@ class Mailer(Generic[ContentType]):
 
     @property
     def can_started(self) -> bool:
-        return not self._deleted and self.status is MailerStatus.STOPPED
+        return not self._deleted and not self._starting and self.status is MailerStatus.STOPPED
 
     @property
     def can_extended(self) -> bool:
@@ -164,12 +274,25 @@ class Mailer(Generic[ContentType]):
 
     @property
     def can_reset(self) -> bool:
+        counters = self.counters
         return (
             not self._deleted
             and self.status is not MailerStatus.STARTED
-            and self.chats.total != self.chats.pending
+            and bool(counters.get(ChatState.FAILED) or counters.get(ChatState.SUCCESS))
         )
 
+    async def hydrate(self) -> None:
+        storage = self.broadcaster.storage
+        if self.hydrated or not storage:
+            return
+        if storage.chat_queue:
+            record = await storage.get_bare_record(mailer_id=self.id)
+        else:
+            record = await storage.get_record(mailer_id=self.id)
+        if not self.hydrated:
+            self._hydrate(record=record)
+            logger.info("Mailer id=%d was hydrated from storage.", self.id)
+
     async def delete(self) -> None:
         if not self.can_deleted:
             raise MailerDeleteError(mailer_id=self.id)
@@ -178,8 +301,11 @@ class Mailer(Generic[ContentType]):
         self._stop_event.set()
         self._deleted = True
         del self.broadcaster.mailers[self.id]
-        if self.broadcaster.storage:
-            await self.broadcaster.storage.delete_record(mailer_id=self.id)
+        async with self._preserve_lock:  # Waits for a flush that is writing this mailer.
+            if self.broadcaster.flusher:
+                self.broadcaster.flusher.discard(mailer_id=self.id)
+            if self.broadcaster.storage:
+                await self.broadcaster.storage.delete_record(mailer_id=self.id)
         await self.broadcaster.event.emit_deleted(**self.context)
 
     async def stop(self) -> None:
@@ -196,6 +322,24 @@ class Mailer(Generic[ContentType]):
     async def _start(self) -> bool:
         if not self.can_started:
             raise MailerStartError(mailer_id=self.id)
+        self._starting = True  # Before the first await, so a concurrent start is rejected.
+        acquired = False
+        try:
+            acquired = await self._acquire_lease()
+        finally:
+            self._starting = acquired
+        if not acquired:
+            return False
+        try:
+            return await self._run()
+        finally:
+            await self._release_lease()
+
+    async def _run(self) -> bool:
+        try:
+            await self.hydrate()
+        finally:
+            self._starting = False
         logger.info("Mailer id=%d was started.", self.id)
         self.status = MailerStatus.STARTED
         self._stop_event.clear()
@@ -206,6 +350,9 @@ class Mailer(Generic[ContentType]):
             await self.stop()
             raise
         if not completed:
+            if self.status is MailerStatus.STARTED:  # The lease was lost while running.
+                self.status = MailerStatus.STOPPED
+                await self.broadcaster.event.emit_stopped(**self.context)
             return False
         logger.info("Mailer id=%d was completed.", self.id)
         self.status = MailerStatus.COMPLETED
@@ -216,11 +363,10 @@ class Mailer(Generic[ContentType]):
     async def extend(self, chats: Iterable[int]) -> set[int]:
         if not self.can_extended:
             raise MailerExtendError(mailer_id=self.id)
-        difference = set(chats) - self.chats.total.ids
+        await self.hydrate()
+        difference = await self._extend_chats(chats=chats)
         if not difference:
             return difference
-        self.chats.registry[ChatState.PENDING].update(difference)
-        await self._preserve_chats()
         if self.status is MailerStatus.COMPLETED:
             self.status = MailerStatus.STOPPED
         logger.info(
@@ -233,10 +379,16 @@ class Mailer(Generic[ContentType]):
     async def reset(self) -> None:
         if not self.can_reset:
             raise MailerResetError(mailer_id=self.id)
-        total_chats = self.chats.total.ids
-        self.chats.registry.clear()
-        self.chats.registry[ChatState.PENDING].update(total_chats)
-        await self._preserve_chats()
+        await self.hydrate()
+        if chat_queue := self._chat_queue:
+            async with self._preserve_lock:
+                await chat_queue.reset_chats(mailer_id=self.id)
+            self._counters = await chat_queue.count_chats(mailer_id=self.id)
+        else:
+            processed_chats = self.chats.processed.ids
+            self._unsaved.update(dict.fromkeys(processed_chats, ChatState.PENDING))
+            self.chats.mark(state=ChatState.PENDING, chats=processed_chats)
+            await self._preserve_chats()
         if self.status is MailerStatus.COMPLETED:
             self.status = MailerStatus.STOPPED
         logger.info("Mailer id=%d has been reset.")
@@ -248,6 +400,7 @@ class Mailer(Generic[ContentType]):
         disable_placeholders: bool = False,
         disable_error_handling: bool = False,
     ) -> tuple[bool, Any]:
+        await self.hydrate()
         method = await self.content.as_method(
             chat_id=chat_id,
             **self.context,
@@ -256,14 +409,20 @@ class Mailer(Generic[ContentType]):
         if not disable_placeholders:
             method = await self.broadcaster.placeholder.render(
                 method,
+                self._placeholders,
                 chat_id=chat_id,
                 **self.context,
             )
+        rate_limiter = self.broadcaster.rate_limiter
+        if rate_limiter:
+            await rate_limiter.acquire(bot_id=self.bot.id, chat_id=chat_id)
         if disable_error_handling:
             return True, await method
         try:
             response = await method
         except TelegramAPIError as error:
+            if rate_limiter and isinstance(error, TelegramRetryAfter):
+                await rate_limiter.suspend(bot_id=self.bot.id, delay=error.retry_after)
             logger.info(
                 "Mailer id=%d failed send the content to chat id=%d due to: %s.",
                 self.id,
@@ -289,21 +448,221 @@ class Mailer(Generic[ContentType]):
             )
             return True, response
 
+    @property
+    def _chat_queue(self) -> Optional["BaseStorage"]:
+        storage = self.broadcaster.storage
+        return storage if storage and storage.chat_queue else None
+
+    def _hydrate(self, record: StorageRecord) -> None:
+        self._content = cast("ContentType", record.content)
+        self._interval = record.interval
+        if not self._chat_queue:
+            self._chats = record.chats
+            self._counters = {}
+
     async def _process_chats(self) -> bool:
-        while self.chats.registry[ChatState.PENDING]:
-            if self._stop_event.is_set():
-                return False
-            chat = self.chats.registry[ChatState.PENDING].pop()
+        self._placeholders = await self.broadcaster.placeholder.resolve(**self.context)
+        try:
+            while True:
+                await self._run_workers()
+                chat_queue = self._chat_queue
+                if not chat_queue:
+                    return not self.chats.registry[ChatState.PENDING]
+                self._counters = await chat_queue.count_chats(mailer_id=self.id)
+                if self._stop_event.is_set():
+                    return False
+                if not self._counters[ChatState.PENDING]:
+                    return True
+                # Other owners still hold claims; wait until they finish or the claims expire.
+                interval = chat_queue.claim_timeout / CLAIM_POLL_RATIO
+                if not await sleep_until(self._stop_event, min(interval, MAX_CLAIM_POLL_INTERVAL)):
+                    return False
+        finally:
+            self._placeholders = None
+
+    async def _run_workers(self) -> None:
+        workers = [create_task(coro=self._process_worker()) for _ in range(self.concurrency)]
+        try:
+            await gather(*workers)
+        except:
+            self._stop_event.set()
+            await gather(*workers, return_exceptions=True)
+            raise
+        finally:
+            await self._checkpoint(force=True)
+            if self.broadcaster.flusher:
+                await self.broadcaster.flusher.flush()
+            await self._release_chats()
+
+    async def _process_worker(self) -> None:
+        while not self._stop_event.is_set():
+            chat = await self._claim_chat()
+            if chat is None:
+                return
             success, _ = await self.send(chat_id=chat)
-            self.chats.registry[ChatState.SUCCESS if success else ChatState.FAILED].add(chat)
-            await self._preserve_chats()
-            if not self.chats.registry[ChatState.PENDING]:
-                return True
+            state = ChatState.SUCCESS if success else ChatState.FAILED
+            if self._chats is None:
+                self._counters[state] += 1
+            else:
+                self._chats.registry[state].add(chat)
+            self._unsaved[chat] = state
+            await self._checkpoint()
+            if not self.counters[ChatState.PENDING]:
+                continue
             if self.interval:
                 await self.interval.sleep(self._stop_event, **self.context)
+
+    async def _extend_chats(self, chats: Iterable[int]) -> set[int]:
+        if chat_queue := self._chat_queue:
+            async with self._preserve_lock:
+                difference = await chat_queue.extend_chats(mailer_id=self.id, chats=chats)
+            self._counters[ChatState.PENDING] += len(difference)
+            return difference
+        difference = {chat for chat in set(chats) if chat not in self.chats.total}
+        if difference:
+            self.chats.registry[ChatState.PENDING].update(difference)
+            self._unsaved.update(dict.fromkeys(difference, ChatState.PENDING))
+            await self._preserve_chats()
+        return difference
+
+    async def _claim_chat(self) -> Optional[int]:
+        chat = await self._take_chat()
+        if chat is not None and self._placeholders:
+            await self._prefetch_placeholders(chat=chat, items=self._placeholders)
+        return chat
+
+    async def _take_chat(self) -> Optional[int]:
+        if chat_queue := self._chat_queue:
+            if not self._claimed:
+                async with self._preserve_lock:
+                    if not self._claimed:
+                        chats = await chat_queue.claim_chats(
+                            mailer_id=self.id,
+                            count=chat_queue.claim_batch_size,
+                        )
+                        self._claimed.extend(chats)
+            if not self._claimed:
+                self._counters[ChatState.PENDING] = 0
+                return None
+            self._counters[ChatState.PENDING] = max(self._counters[ChatState.PENDING] - 1, 0)
+            return self._claimed.pop()
+        pending = self.chats.registry[ChatState.PENDING]
+        return pending.pop() if pending else None
+
+    async def _prefetch_placeholders(self, chat: int, items: "PlaceholderItems") -> None:
+        placeholder = self.broadcaster.placeholder
+        batch_size = placeholder.get_batch_size(items)
+        if not batch_size:
+            return
+        if self._chat_queue:
+            upcoming = self._claimed[-1:-batch_size:-1]
+        else:
+            pending = self.chats.registry[ChatState.PENDING]
+            if isinstance(pending, CompactChatSet):
+                upcoming = pending.peek(count=batch_size - 1)
+            else:
+                upcoming = list(islice(pending, batch_size - 1))
+        await placeholder.prefetch(items, [chat, *upcoming], **self.context)
+
+    async def _release_chats(self) -> None:
+        chat_queue = self._chat_queue
+        claimed, self._claimed = self._claimed, []
+        if chat_queue and claimed:
+            async with self._preserve_lock:
+                await chat_queue.release_chats(mailer_id=self.id, chats=claimed)
+            self._counters[ChatState.PENDING] += len(claimed)
+
+    async def _acquire_lease(self) -> bool:
+        storage = self.broadcaster.storage
+        timeout = self.broadcaster.lease_timeout
+        if not storage or timeout is None:
+            return True
+        acquired = await storage.acquire_lease(
+            mailer_id=self.id,
+            owner_id=self.broadcaster.owner_id,
+            timeout=timeout,
+        )
+        if not acquired:
+            self._awaiting_lease = True
+            logger.info("Mailer id=%d is leased by another process.", self.id)
+            return False
+        if self._chats is not None:  # Another owner may have progressed in the meantime.
+            try:
+                self._chats = await storage.get_chat_states(mailer_id=self.id)
+            except:
+                self._awaiting_lease = True  # Let failover retry the start.
+                try:
+                    await storage.release_lease(
+                        mailer_id=self.id,
+                        owner_id=self.broadcaster.owner_id,
+                    )
+                except Exception:
+                    logger.exception("Mailer id=%d failed to release the lease.", self.id)
+                raise
+        self._awaiting_lease = False
+        self._lease_task = create_task(coro=self._renew_lease(storage=storage, timeout=timeout))
         return True
 
+    async def _renew_lease(self, storage: "BaseStorage", timeout: float) -> None:
+        while True:
+            await sleep(timeout / LEASE_RENEWAL_RATIO)
+            try:
+                renewed = await storage.acquire_lease(
+                    mailer_id=self.id,
+                    owner_id=self.broadcaster.owner_id,
+                    timeout=timeout,
+                )
+            except Exception:
+                logger.exception("Mailer id=%d failed to renew the lease.", self.id)
+                continue
+            if not renewed:
+                logger.warning("Mailer id=%d lost the lease to another process.", self.id)
+                self._awaiting_lease = True
+                self._stop_event.set()
+                return
+
+    async def _release_lease(self) -> None:
+        storage = self.broadcaster.storage
+        lease_task, self._lease_task = self._lease_task, None
+        if not storage or not lease_task:
+            return
+        lease_task.cancel()
+        with suppress(CancelledError):
+            await lease_task
+        if self._awaiting_lease:
+            return
+        try:
+            await storage.release_lease(mailer_id=self.id, owner_id=self.broadcaster.owner_id)
+        except Exception:
+            logger.exception("Mailer id=%d failed to release the lease.", self.id)
+
+    async def _checkpoint(self, *, force: bool = False) -> None:
+        if not self._unsaved:
+            return
+        elapsed = monotonic() - self._preserved_at
+        unsaved = len(self._unsaved)
+        if force or self.broadcaster.checkpoint.is_due(unsaved=unsaved, elapsed=elapsed):
+            await self._preserve_chats()
+
     async def _preserve_chats(self) -> None:
-        if self.broadcaster.storage:
-            async with self.broadcaster.storage.update_record(mailer_id=self.id) as record:
-                record.chats = self.chats
+        unsaved, self._unsaved = self._unsaved, {}
+        self._preserved_at = monotonic()
+        if not self.broadcaster.storage:
+            return
+        if self.broadcaster.flusher:
+            await self.broadcaster.flusher.submit(
+                mailer_id=self.id,
+                transitions=unsaved,
+                lock=self._preserve_lock,
+            )
+            return
+        transitions: defaultdict[ChatState, list[int]] = defaultdict(list)
+        for chat, state in unsaved.items():
+            transitions[state].append(chat)
+        async with self._preserve_lock:
+            for state, chats in transitions.items():
+                await self.broadcaster.storage.mark_chats(
+                    mailer_id=self.id,
+                    state=state,
+                    chats=chats,
+                )
@@ -1,4 +1,9 @@
-__all__ = ("Placeholder",)
+__all__ = (
+    "CacheScope",
+    "Placeholder",
+    "PlaceholderCache",
+)
 
 
+from .cache import CacheScope, PlaceholderCache
 from .placeholder import Placeholder
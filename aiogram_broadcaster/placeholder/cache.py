@@ -0,0 +1,64 @@
+from asyncio import Future
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from enum import Enum
+from time import monotonic
+from typing import Any, Optional
+
+
+DEFAULT_CACHE_KEYS = ("chat_id",)
+DEFAULT_CACHE_SIZE = 1024
+
+
+class CacheScope(str, Enum):
+    SEND = "send"
+    MAILER = "mailer"
+    GLOBAL = "global"
+
+
+@dataclass(frozen=True)
+class PlaceholderCache:
+    scope: CacheScope = CacheScope.SEND
+    keys: tuple[str, ...] = DEFAULT_CACHE_KEYS
+    ttl: Optional[float] = None
+    max_size: int = DEFAULT_CACHE_SIZE
+
+    def __post_init__(self) -> None:
+        if self.ttl is not None and self.ttl <= 0:
+            raise ValueError("TTL must be positive.")
+        if self.max_size < 1:
+            raise ValueError("Max size must be at least one.")
+
+    def build_key(self, **context: Any) -> tuple[Hashable, ...]:
+        return tuple(context.get(key) for key in self.keys)
+
+
+class PlaceholderMemo:
+    def __init__(self, cache: PlaceholderCache) -> None:
+        self.cache = cache
+        self._entries: OrderedDict[tuple[Hashable, ...], tuple[float, Future[Any]]] = OrderedDict()
+
+    def get(self, key: tuple[Hashable, ...]) -> Optional[Future[Any]]:
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        expires_at, future = entry
+        if monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return future
+
+    def set(self, key: tuple[Hashable, ...], future: Future[Any]) -> None:
+        ttl = self.cache.ttl
+        expires_at = monotonic() + ttl if ttl is not None else float("inf")
+        self._entries[key] = (expires_at, future)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.cache.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: tuple[Hashable, ...], future: Future[Any]) -> None:
+        entry = self._entries.get(key)
+        if entry and entry[1] is future:
+            del self._entries[key]
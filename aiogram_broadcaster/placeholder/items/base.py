@@ -1,20 +1,72 @@
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Any, Callable
+from asyncio import ensure_future, get_running_loop, shield
+from collections.abc import Awaitable, Mapping, Sequence
+from copy import copy
+from typing import TYPE_CHECKING, Any, Callable, Optional, cast
 
 from aiogram.dispatcher.event.handler import CallableObject
 from typing_extensions import Self
 
+from aiogram_broadcaster.placeholder.cache import (
+    DEFAULT_CACHE_SIZE,
+    CacheScope,
+    PlaceholderCache,
+    PlaceholderMemo,
+)
+
 
 if TYPE_CHECKING:
+    from asyncio import Future
+
     from aiogram_broadcaster.placeholder.placeholder import Placeholder
 
 
+DEFAULT_TEMPLATE_CACHE_SIZE = 256
+PER_CHAT_PARAMETERS = frozenset({"chat_id", "match", "template"})
+UNHASHED_ATTRIBUTES = frozenset({"_memo", "_run_memo"})
+BATCH_CACHE_KEYS = ("chat_id",)
+RUN_CACHE = PlaceholderCache(scope=CacheScope.MAILER, keys=())
+
+
 class BasePlaceholderItem:
-    def __init__(self, value: Any) -> None:
+    def __init__(
+        self,
+        value: Any,
+        *,
+        per_chat: Optional[bool] = None,
+        cache: Optional[PlaceholderCache] = None,
+        batch_size: Optional[int] = None,
+    ) -> None:
+        if batch_size is not None:
+            if batch_size < 1:
+                raise ValueError("Batch size must be at least one.")
+            if not callable(value):
+                raise ValueError("Batch placeholders must be callable.")
+            if not cache:
+                cache = PlaceholderCache(
+                    scope=CacheScope.MAILER,
+                    max_size=max(DEFAULT_CACHE_SIZE, batch_size * 2),
+                )
+            elif cache.keys != BATCH_CACHE_KEYS:
+                raise ValueError("Batch placeholders must be cached by the chat id.")
         self._value = CallableObject(callback=value) if callable(value) else value
+        if (
+            per_chat is False
+            and isinstance(self._value, CallableObject)
+            and self._value.params & PER_CHAT_PARAMETERS
+        ):
+            raise ValueError("Placeholders with per-chat parameters cannot be resolved per run.")
+        self._per_chat = per_chat
+        self._batch_size = batch_size
+        self._cache = cache
+        self._memo = PlaceholderMemo(cache=cache) if cache else None
+        self._run_memo: Optional[PlaceholderMemo] = None
 
     def __hash__(self) -> int:
-        return hash((type(self), repr(vars(self))))
+        state = {
+            name: value for name, value in vars(self).items() if name not in UNHASHED_ATTRIBUTES
+        }
+        return hash((type(self), repr(state)))
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, BasePlaceholderItem):
@@ -27,10 +79,110 @@ class BasePlaceholderItem:
             return self._value.callback
         return self._value
 
+    @property
+    def cache(self) -> Optional[PlaceholderCache]:
+        return self._cache
+
+    @property
+    def batch_size(self) -> Optional[int]:
+        return self._batch_size
+
+    @property
+    def per_chat(self) -> bool:
+        if self._batch_size is not None:
+            return True
+        if self._per_chat is not None:
+            return self._per_chat
+        return isinstance(self._value, CallableObject)
+
     async def get_value(self, **context: Any) -> Any:
-        if isinstance(self._value, CallableObject):
-            return await self._value.call(**context)
-        return self._value
+        if not isinstance(self._value, CallableObject):
+            return self._value
+        if self._run_memo:
+            return await self._get_memoized(self._run_memo, self._get_value, **context)
+        return await self._get_value(**context)
+
+    async def prefetch(self, chat_ids: Sequence[int], **context: Any) -> None:
+        memo = self._memo
+        if not self._batch_size or not memo or not chat_ids or memo.get(key=(chat_ids[0],)):
+            return
+        futures = self._reserve_batch(memo=memo, chat_ids=chat_ids[: self._batch_size])
+        try:
+            values = await self._call_batch(list(futures), **context)
+        except Exception as error:
+            for future in futures.values():
+                future.set_exception(error)
+                future.exception()  # Waiters receive the error, idle futures stay silent.
+            raise
+        else:
+            for chat_id, future in futures.items():
+                future.set_result(values.get(chat_id))
+        finally:
+            for chat_id, future in futures.items():
+                if future.cancel() or future.exception():
+                    memo.discard(key=(chat_id,), future=future)
+
+    async def resolve(self, **context: Any) -> Self:  # noqa: ARG002
+        if not isinstance(self._value, CallableObject):
+            return self
+        if self.per_chat:
+            return self.scoped(scope=CacheScope.MAILER)
+        item = copy(self)
+        item._run_memo = PlaceholderMemo(cache=RUN_CACHE)  # noqa: SLF001
+        return item
+
+    def scoped(self, scope: CacheScope) -> Self:
+        if not self._cache or self._cache.scope is not scope:
+            return self
+        item = copy(self)
+        item._memo = PlaceholderMemo(cache=self._cache)  # noqa: SLF001
+        return item
+
+    async def _get_value(self, **context: Any) -> Any:
+        if not self._memo:
+            return await self._call(**context)
+        return await self._get_memoized(self._memo, self._call, **context)
+
+    async def _get_memoized(
+        self,
+        memo: PlaceholderMemo,
+        call: Callable[..., Awaitable[Any]],
+        **context: Any,
+    ) -> Any:
+        key = memo.cache.build_key(**context)
+        future = memo.get(key=key)
+        if not future:
+            future = ensure_future(call(**context))
+            memo.set(key=key, future=future)
+        try:
+            return await shield(future)
+        except Exception:
+            memo.discard(key=key, future=future)
+            raise
+
+    async def _call(self, **context: Any) -> Any:
+        if self._batch_size is None:
+            return await cast("CallableObject", self._value).call(**context)
+        chat_id = context.pop("chat_id")
+        values = await self._call_batch([chat_id], **context)
+        return values.get(chat_id)
+
+    def _reserve_batch(
+        self,
+        memo: PlaceholderMemo,
+        chat_ids: Sequence[int],
+    ) -> dict[int, "Future[Any]"]:
+        loop = get_running_loop()
+        futures: dict[int, Future[Any]] = {}
+        for chat_id in chat_ids:
+            if not memo.get(key=(chat_id,)):
+                futures[chat_id] = loop.create_future()
+                memo.set(key=(chat_id,), future=futures[chat_id])
+        return futures
+
+    async def _call_batch(self, chat_ids: list[int], **context: Any) -> Mapping[int, Any]:
+        values = await cast("CallableObject", self._value).call(chat_ids, **context)
+        return cast("Mapping[int, Any]", values)
 
 
 class BasePlaceholderDecorator(ABC):
@@ -1,21 +1,38 @@
 # ruff: noqa: PLC0415
 
+from collections.abc import Collection
+from functools import lru_cache
 from importlib import import_module
-from typing import TYPE_CHECKING, Any, Callable
+from typing import TYPE_CHECKING, Any, Callable, Optional
 
 from aiogram_broadcaster.utils.exceptions import DependencyNotFoundError
 
-from .base import BasePlaceholderDecorator, BasePlaceholderEngine, BasePlaceholderItem
+from .base import (
+    DEFAULT_TEMPLATE_CACHE_SIZE,
+    BasePlaceholderDecorator,
+    BasePlaceholderEngine,
+    BasePlaceholderItem,
+)
 
 
 if TYPE_CHECKING:
     from jinja2 import Template
     from typing_extensions import Self
 
+    from aiogram_broadcaster.placeholder.cache import PlaceholderCache
+
 
 class JinjaPlaceholderItem(BasePlaceholderItem):
-    def __init__(self, value: Any, name: str) -> None:
-        super().__init__(value=value)
+    def __init__(
+        self,
+        value: Any,
+        name: str,
+        *,
+        per_chat: Optional[bool] = None,
+        cache: Optional["PlaceholderCache"] = None,
+        batch_size: Optional[int] = None,
+    ) -> None:
+        super().__init__(value=value, per_chat=per_chat, cache=cache, batch_size=batch_size)
 
         self.name = name
 
@@ -37,21 +54,29 @@ class JinjaPlaceholderDecorator(BasePlaceholderDecorator):
         def __call__(
             self,
             name: str,
+            *,
+            per_chat: Optional[bool] = ...,
+            cache: Optional["PlaceholderCache"] = ...,
+            batch_size: Optional[int] = ...,
         ) -> Callable[[Callable[..., Any]], Callable[..., Any]]: ...
 
         def register(
             self,
             value: Any,
             name: str,
+            *,
+            per_chat: Optional[bool] = ...,
+            cache: Optional["PlaceholderCache"] = ...,
+            batch_size: Optional[int] = ...,
         ) -> Self: ...
 
 
 class JinjaPlaceholderEngine(BasePlaceholderEngine):
-    async def render(self, source: str, *items: JinjaPlaceholderItem, **context: Any) -> str:
-        from jinja2 import Template
+    def __init__(self, cache_size: Optional[int] = DEFAULT_TEMPLATE_CACHE_SIZE) -> None:
+        self.compile_template = lru_cache(maxsize=cache_size)(self._compile_template)
 
-        template = Template(source=source)
-        template_keys = self.get_template_keys(template=template, source=source)
+    async def render(self, source: str, *items: JinjaPlaceholderItem, **context: Any) -> str:
+        template, template_keys = self.compile_template(source)
         if not template_keys:
             return source
         data = await self.get_data(
@@ -64,6 +89,13 @@ class JinjaPlaceholderEngine(BasePlaceholderEngine):
             return source
         return template.render(data)
 
+    def _compile_template(self, source: str) -> tuple["Template", frozenset[str]]:
+        from jinja2 import Template
+
+        template = Template(source=source)
+        template_keys = self.get_template_keys(template=template, source=source)
+        return template, frozenset(template_keys)
+
     def get_template_keys(self, template: "Template", source: str) -> set[str]:
         from jinja2.meta import find_undeclared_variables
 
@@ -72,7 +104,7 @@ class JinjaPlaceholderEngine(BasePlaceholderEngine):
 
     async def get_data(
         self,
-        template_keys: set[str],
+        template_keys: Collection[str],
         *items: JinjaPlaceholderItem,
         **context: Any,
     ) -> dict[str, Any]:
@@ -1,13 +1,34 @@
+from collections import defaultdict
 from enum import Enum
-from re import Pattern, RegexFlag, compile
-from typing import TYPE_CHECKING, Any, Callable, Union
+from functools import lru_cache
+from re import Match, Pattern, RegexFlag, compile, error
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union
 
-from .base import BasePlaceholderDecorator, BasePlaceholderEngine, BasePlaceholderItem
+from .base import (
+    DEFAULT_TEMPLATE_CACHE_SIZE,
+    BasePlaceholderDecorator,
+    BasePlaceholderEngine,
+    BasePlaceholderItem,
+)
 
 
 if TYPE_CHECKING:
     from typing_extensions import Self
 
+    from aiogram_broadcaster.placeholder.cache import PlaceholderCache
+
+
+SCANNER_GROUP_PREFIX = "_regexp_item_"
+TEMPLATE_ESCAPE = "\\"
+SCOPED_FLAGS = {
+    RegexFlag.IGNORECASE: "i",
+    RegexFlag.MULTILINE: "m",
+    RegexFlag.DOTALL: "s",
+    RegexFlag.VERBOSE: "x",
+}
+# Numbered references and global inline flags change meaning inside an alternation.
+UNSCANNABLE_PATTERN = compile(r"\\[1-9]|\(\?\(\d|^\(\?[aiLmsux]+\)")
+
 
 class RegexMode(str, Enum):
     SEARCH = "search"
@@ -24,8 +45,11 @@ class RegexpPlaceholderItem(BasePlaceholderItem):
         pattern: Union[str, Pattern[str]],
         flags: Union[int, RegexFlag] = 0,
         mode: RegexMode = RegexMode.MATCH,
+        *,
+        per_chat: Optional[bool] = None,
+        cache: Optional["PlaceholderCache"] = None,
     ) -> None:
-        super().__init__(value=value)
+        super().__init__(value=value, per_chat=per_chat, cache=cache)
 
         self.pattern = (
             compile(pattern=pattern, flags=flags) if isinstance(pattern, str) else pattern
@@ -44,6 +68,9 @@ class RegexpPlaceholderDecorator(BasePlaceholderDecorator):
             pattern: Union[str, Pattern[str]],
             flags: Union[int, RegexFlag] = ...,
             mode: RegexMode = ...,
+            *,
+            per_chat: Optional[bool] = ...,
+            cache: Optional["PlaceholderCache"] = ...,
         ) -> Callable[[Callable[..., Any]], Callable[..., Any]]: ...
 
         def register(
@@ -52,11 +79,53 @@ class RegexpPlaceholderDecorator(BasePlaceholderDecorator):
             pattern: Union[str, Pattern[str]],
             flags: Union[int, RegexFlag] = ...,
             mode: RegexMode = ...,
+            *,
+            per_chat: Optional[bool] = ...,
+            cache: Optional["PlaceholderCache"] = ...,
         ) -> Self: ...
 
 
 class RegexpPlaceholderEngine(BasePlaceholderEngine):
+    def __init__(self, cache_size: Optional[int] = DEFAULT_TEMPLATE_CACHE_SIZE) -> None:
+        self.compile_scanner = lru_cache(maxsize=cache_size)(self._compile_scanner)
+
     async def render(self, source: str, *items: RegexpPlaceholderItem, **context: Any) -> str:
+        if not items:
+            return source
+        compiled = self.compile_scanner(tuple(item.pattern for item in items))
+        if not compiled:
+            return await self.render_sequentially(source, *items, **context)
+        scanner, identifier = compiled
+        matches: list[tuple[int, Match[str]]] = []
+        item_matches: defaultdict[int, list[Match[str]]] = defaultdict(list)
+        for scanner_match in scanner.finditer(source):
+            identified = identifier.match(source, scanner_match.start())
+            if not identified:
+                continue
+            index = int(str(identified.lastgroup)[len(SCANNER_GROUP_PREFIX) :])
+            match = items[index].pattern.match(source, scanner_match.start())
+            if match:
+                matches.append((index, match))
+                item_matches[index].append(match)
+        values: dict[int, Any] = {}
+        for index, found in item_matches.items():
+            item = items[index]
+            match_value = self.get_match_value(item, source, found)
+            if not match_value:
+                continue
+            value = await item.get_value(match=match_value, **context)
+            if value is not None:
+                values[index] = value
+        if not values:
+            return source
+        return self.substitute(source, matches, values)
+
+    async def render_sequentially(
+        self,
+        source: str,
+        *items: RegexpPlaceholderItem,
+        **context: Any,
+    ) -> str:
         for item in items:
             regex_method = getattr(item.pattern, item.mode.value)
             match = regex_method(source)
@@ -66,3 +135,76 @@ class RegexpPlaceholderEngine(BasePlaceholderEngine):
             if value is not None:
                 source = item.pattern.sub(repl=value, string=source)
         return source
+
+    def get_match_value(
+        self,
+        item: RegexpPlaceholderItem,
+        source: str,
+        matches: list[Match[str]],
+    ) -> Any:
+        if item.mode is RegexMode.MATCH:
+            return item.pattern.match(source)
+        if item.mode is RegexMode.FULLMATCH:
+            return item.pattern.fullmatch(source)
+        if item.mode is RegexMode.FINDALL:
+            return [self._findall_value(match=match) for match in matches]
+        if item.mode is RegexMode.FINDITER:
+            return iter(matches)
+        return matches[0]
+
+    def substitute(
+        self,
+        source: str,
+        matches: list[tuple[int, Match[str]]],
+        values: dict[int, Any],
+    ) -> str:
+        parts: list[str] = []
+        position = 0
+        for index, match in matches:
+            if index not in values:
+                continue
+            value = values[index]
+            if callable(value):
+                replacement = value(match)
+            elif isinstance(value, str) and TEMPLATE_ESCAPE not in value:
+                replacement = value
+            else:
+                replacement = match.expand(value)
+            parts.extend((source[position : match.start()], replacement))
+            position = match.end()
+        parts.append(source[position:])
+        return "".join(parts)
+
+    def _compile_scanner(
+        self,
+        patterns: tuple[Pattern[str], ...],
+    ) -> Optional[tuple[Pattern[str], Pattern[str]]]:
+        alternatives = []
+        for pattern in patterns:
+            flags = RegexFlag(pattern.flags) & ~RegexFlag.UNICODE
+            if flags & ~sum(SCOPED_FLAGS) or UNSCANNABLE_PATTERN.search(pattern.pattern):
+                return None
+            scoped_flags = "".join(
+                letter for flag, letter in SCOPED_FLAGS.items() if flag in flags
+            )
+            alternatives.append(f"(?{scoped_flags}:{pattern.pattern})")
+        # Capturing groups disable the first character prefilter of an alternation,
+        # so the scan runs without them and the identifier is only tried on hits.
+        named_alternatives = (
+            f"(?P<{SCANNER_GROUP_PREFIX}{index}>{alternative})"
+            for index, alternative in enumerate(alternatives)
+        )
+        try:
+            scanner = compile("|".join(alternatives))
+            identifier = compile("|".join(named_alternatives))
+        except error:
+            return None
+        return scanner, identifier
+
+    def _findall_value(self, match: Match[str]) -> Any:
+        groups = match.groups(default="")
+        if not groups:
+            return match.group()
+        if len(groups) == 1:
+            return groups[0]
+        return groups
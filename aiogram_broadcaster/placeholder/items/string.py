@@ -1,16 +1,33 @@
+from collections.abc import Collection
+from functools import lru_cache
 from string import Template
-from typing import TYPE_CHECKING, Any, Callable
+from typing import TYPE_CHECKING, Any, Callable, Optional
 
-from .base import BasePlaceholderDecorator, BasePlaceholderEngine, BasePlaceholderItem
+from .base import (
+    DEFAULT_TEMPLATE_CACHE_SIZE,
+    BasePlaceholderDecorator,
+    BasePlaceholderEngine,
+    BasePlaceholderItem,
+)
 
 
 if TYPE_CHECKING:
     from typing_extensions import Self
 
+    from aiogram_broadcaster.placeholder.cache import PlaceholderCache
+
 
 class StringPlaceholderItem(BasePlaceholderItem):
-    def __init__(self, value: Any, name: str) -> None:
-        super().__init__(value=value)
+    def __init__(
+        self,
+        value: Any,
+        name: str,
+        *,
+        per_chat: Optional[bool] = None,
+        cache: Optional["PlaceholderCache"] = None,
+        batch_size: Optional[int] = None,
+    ) -> None:
+        super().__init__(value=value, per_chat=per_chat, cache=cache, batch_size=batch_size)
 
         self.name = name
 
@@ -23,19 +40,29 @@ class StringPlaceholderDecorator(BasePlaceholderDecorator):
         def __call__(
             self,
             name: str,
+            *,
+            per_chat: Optional[bool] = ...,
+            cache: Optional["PlaceholderCache"] = ...,
+            batch_size: Optional[int] = ...,
         ) -> Callable[[Callable[..., Any]], Callable[..., Any]]: ...
 
         def register(
             self,
             value: Any,
             name: str,
+            *,
+            per_chat: Optional[bool] = ...,
+            cache: Optional["PlaceholderCache"] = ...,
+            batch_size: Optional[int] = ...,
         ) -> Self: ...
 
 
 class StringPlaceholderEngine(BasePlaceholderEngine):
+    def __init__(self, cache_size: Optional[int] = DEFAULT_TEMPLATE_CACHE_SIZE) -> None:
+        self.compile_template = lru_cache(maxsize=cache_size)(self._compile_template)
+
     async def render(self, source: str, *items: StringPlaceholderItem, **context: Any) -> str:
-        template = Template(template=source)
-        template_keys = self.get_template_keys(template=template, source=source)
+        template, template_keys = self.compile_template(source)
         if not template_keys:
             return source
         data = await self.get_data(
@@ -48,12 +75,17 @@ class StringPlaceholderEngine(BasePlaceholderEngine):
             return source
         return template.safe_substitute(data)
 
+    def _compile_template(self, source: str) -> tuple[Template, frozenset[str]]:
+        template = Template(template=source)
+        template_keys = self.get_template_keys(template=template, source=source)
+        return template, frozenset(template_keys)
+
     def get_template_keys(self, template: Template, source: str) -> set[str]:
         return {match.group("named") for match in template.pattern.finditer(string=source)}
 
     async def get_data(
         self,
-        template_keys: set[str],
+        template_keys: Collection[str],
         *items: StringPlaceholderItem,
         **context: Any,
     ) -> dict[str, Any]:
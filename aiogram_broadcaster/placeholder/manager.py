@@ -1,9 +1,10 @@
 from collections import defaultdict
-from collections.abc import Generator
+from collections.abc import Generator, Sequence
 from typing import TYPE_CHECKING, Any, Optional, TypeVar
 
 from pydantic import BaseModel
 
+from .cache import CacheScope
 from .items.jinja import JinjaPlaceholderEngine, JinjaPlaceholderItem
 from .items.regexp import RegexpPlaceholderEngine, RegexpPlaceholderItem
 from .items.string import StringPlaceholderEngine, StringPlaceholderItem
@@ -15,6 +16,7 @@ if TYPE_CHECKING:
 
 
 ModelType = TypeVar("ModelType", bound=BaseModel)
+PlaceholderItems = dict[type["BasePlaceholderItem"], set["BasePlaceholderItem"]]
 
 TEXT_FIELDS = {"text", "caption", "title", "description"}
 
@@ -30,30 +32,88 @@ class PlaceholderManager(Placeholder):
             RegexpPlaceholderItem: RegexpPlaceholderEngine(),
             StringPlaceholderItem: StringPlaceholderEngine(),
         }
+        self._grouped_items: Optional[tuple[int, PlaceholderItems]] = None
 
-    async def render(self, model: ModelType, /, **context: Any) -> ModelType:
-        if not tuple(self.chain_items):
+    async def render(
+        self,
+        model: ModelType,
+        items: Optional[PlaceholderItems] = None,
+        /,
+        **context: Any,
+    ) -> ModelType:
+        if items is None:
+            items = self.group_items()
+        if not items:
             return model
+        items = self._scope_items(items)
         for field_name, field_value in self._parse_text_fields(model=model):
-            rendered_field_value = await self._render_source(field_value, **context)
+            rendered_field_value = await self._render_source(field_value, items, **context)
             if rendered_field_value != field_value:
                 model = model.model_copy(update={field_name: rendered_field_value})
         return model
 
+    async def resolve(self, **context: Any) -> PlaceholderItems:
+        items: defaultdict[type[BasePlaceholderItem], set[BasePlaceholderItem]] = defaultdict(set)
+        for item in self.chain_items:
+            items[type(item)].add(await item.resolve(**context))
+        return dict(items)
+
+    async def prefetch(
+        self,
+        items: PlaceholderItems,
+        chat_ids: Sequence[int],
+        /,
+        **context: Any,
+    ) -> None:
+        for type_items in items.values():
+            for item in type_items:
+                await item.prefetch(chat_ids, **context)
+
+    def get_batch_size(self, items: PlaceholderItems) -> int:
+        return max(
+            (item.batch_size or 0 for type_items in items.values() for item in type_items),
+            default=0,
+        )
+
+    def group_items(self) -> PlaceholderItems:
+        if self._grouped_items is None or self._grouped_items[0] != self.chain_version:
+            self._grouped_items = (self.chain_version, self._group_items())
+        return self._grouped_items[1]
+
+    def _group_items(self) -> PlaceholderItems:
+        items: defaultdict[type[BasePlaceholderItem], set[BasePlaceholderItem]] = defaultdict(set)
+        for item in self.chain_items:
+            items[type(item)].add(item)
+        return dict(items)
+
+    def _scope_items(self, items: PlaceholderItems) -> PlaceholderItems:
+        scoped_items: PlaceholderItems = {}
+        for item_type, type_items in items.items():
+            if any(item.cache and item.cache.scope is CacheScope.SEND for item in type_items):
+                scoped_items[item_type] = {
+                    item.scoped(scope=CacheScope.SEND) for item in type_items
+                }
+            else:
+                scoped_items[item_type] = type_items
+        return scoped_items
+
     def _parse_text_fields(self, model: BaseModel) -> Generator[tuple[str, str], None, None]:
         mapped_model = dict(model)
         for field_name in TEXT_FIELDS:
             if field_value := mapped_model.get(field_name):
                 yield field_name, field_value
 
-    async def _render_source(self, source: str, /, **context: Any) -> str:
-        grouped_items = defaultdict(set)
-        for item in self.chain_items:
-            grouped_items[type(item)].add(item)
-        for item_type, items in grouped_items.items():
+    async def _render_source(
+        self,
+        source: str,
+        items: PlaceholderItems,
+        /,
+        **context: Any,
+    ) -> str:
+        for item_type, type_items in items.items():
             source = await self.engines[item_type].render(
                 source,
-                *items,
+                *type_items,
                 **context,
             )
         return source
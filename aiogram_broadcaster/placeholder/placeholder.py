@@ -1,4 +1,3 @@
-from collections.abc import Generator
 from typing import TYPE_CHECKING, Optional
 
 from typing_extensions import Self
@@ -20,6 +19,7 @@ class Placeholder(Chain["Placeholder"], sub_name="placeholder"):
         super().__init__(name=name)
 
         self.items: set[BasePlaceholderItem] = set()
+        self._chain_items: Optional[tuple[int, tuple[BasePlaceholderItem, ...]]] = None
         self.jinja = JinjaPlaceholderDecorator(placeholder=self)
         self.regexp = RegexpPlaceholderDecorator(placeholder=self)
         self.string = StringPlaceholderDecorator(placeholder=self)
@@ -30,12 +30,15 @@ class Placeholder(Chain["Placeholder"], sub_name="placeholder"):
         }
 
     @property
-    def chain_items(self) -> Generator[BasePlaceholderItem, None, None]:
-        for placeholder in self.chain_tail:
-            yield from placeholder.items
+    def chain_items(self) -> tuple[BasePlaceholderItem, ...]:
+        if self._chain_items is None or self._chain_items[0] != self.chain_version:
+            items = [item for placeholder in self.chain_snapshot for item in placeholder.items]
+            self._chain_items = (self.chain_version, tuple(items))
+        return self._chain_items[1]
 
     def register(self, *items: BasePlaceholderItem) -> Self:
         if not items:
             raise ValueError("At least one item must be provided to register.")
         self.items.update(items)
+        self.invalidate_chain()
         return self
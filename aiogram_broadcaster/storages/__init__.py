@@ -2,6 +2,7 @@
 
 __all__ = (
     "BaseStorage",
+    "CachedStorage",
     "FileStorage",
     "MongoDBStorage",
     "RedisStorage",
@@ -14,6 +15,7 @@ from typing import TYPE_CHECKING as _TYPE_CHECKING
 from aiogram_broadcaster.utils.lazy_importer import lazy_importer as _lazy_importer
 
 from .base import BaseStorage
+from .cached import CachedStorage
 from .file import FileStorage
 
 
@@ -1,33 +1,105 @@
 from abc import ABC, abstractmethod
-from collections.abc import AsyncGenerator, AsyncIterable
+from collections.abc import AsyncGenerator, AsyncIterable, Iterable
 from contextlib import asynccontextmanager
 from typing import Optional
 
 from pydantic import BaseModel, ConfigDict, Field, JsonValue, SerializeAsAny
+from typing_extensions import Self
 
 from aiogram_broadcaster.contents.base import BaseContent
 from aiogram_broadcaster.intervals.base import BaseInterval
-from aiogram_broadcaster.mailer.chats import Chats
+from aiogram_broadcaster.mailer.chats import Chats, ChatState
 
 
 class StorageRecord(BaseModel):
     model_config = ConfigDict(validate_assignment=True)
 
-    chats: Chats
+    chats: Chats = Field(default_factory=Chats)
     content: SerializeAsAny[BaseContent]
     interval: Optional[SerializeAsAny[BaseInterval]] = None
+    concurrency: int = Field(default=1, ge=1)
     bot_id: int
     context: dict[str, JsonValue] = Field(default_factory=dict)
 
 
+class StorageStub(BaseModel):
+    concurrency: int = Field(default=1, ge=1)
+    bot_id: int
+    context: dict[str, JsonValue] = Field(default_factory=dict)
+    counters: dict[ChatState, int] = Field(default_factory=dict)
+
+    @classmethod
+    def from_record(cls, record: StorageRecord) -> Self:
+        return cls(
+            concurrency=record.concurrency,
+            bot_id=record.bot_id,
+            context=record.context,
+            counters=record.chats.counters,
+        )
+
+
+DEFAULT_CLAIM_TIMEOUT = 300.0
+
+
 class BaseStorage(ABC):
+    chat_queue: bool = False
+    claim_timeout: float = DEFAULT_CLAIM_TIMEOUT
+    claim_batch_size: int = 1
+
     @asynccontextmanager
     async def update_record(self, mailer_id: int) -> AsyncGenerator[StorageRecord, None]:
         record = await self.get_record(mailer_id=mailer_id)
-        try:
-            yield record
-        finally:
-            await self.set_record(mailer_id=mailer_id, record=record)
+        yield record  # Nothing is written when the block raises.
+        await self.set_record(mailer_id=mailer_id, record=record)
+
+    async def mark_chats(self, mailer_id: int, state: ChatState, chats: Iterable[int]) -> None:
+        async with self.update_record(mailer_id=mailer_id) as record:
+            record.chats.mark(state=state, chats=chats)
+
+    async def get_chat_states(self, mailer_id: int) -> Chats:
+        record = await self.get_record(mailer_id=mailer_id)
+        return record.chats
+
+    async def get_bare_record(self, mailer_id: int) -> StorageRecord:
+        record = await self.get_record(mailer_id=mailer_id)
+        record.chats = Chats(compact=record.chats.compact)
+        return record
+
+    async def claim_chats(self, mailer_id: int, count: int) -> list[int]:
+        async with self.update_record(mailer_id=mailer_id) as record:
+            pending = record.chats.registry[ChatState.PENDING]
+            return [pending.pop() for _ in range(min(count, len(pending)))]
+
+    async def release_chats(self, mailer_id: int, chats: Iterable[int]) -> None:
+        await self.mark_chats(mailer_id=mailer_id, state=ChatState.PENDING, chats=chats)
+
+    async def count_chats(self, mailer_id: int) -> dict[ChatState, int]:
+        chats = await self.get_chat_states(mailer_id=mailer_id)
+        return chats.counters
+
+    async def extend_chats(self, mailer_id: int, chats: Iterable[int]) -> set[int]:
+        async with self.update_record(mailer_id=mailer_id) as record:
+            difference = {chat for chat in set(chats) if chat not in record.chats.total}
+            record.chats.mark(state=ChatState.PENDING, chats=difference)
+        return difference
+
+    async def reset_chats(self, mailer_id: int) -> None:
+        async with self.update_record(mailer_id=mailer_id) as record:
+            record.chats.mark(state=ChatState.PENDING, chats=record.chats.processed.ids)
+
+    async def acquire_lease(self, mailer_id: int, owner_id: int, timeout: float) -> bool:  # noqa: ARG002
+        return True
+
+    async def release_lease(self, mailer_id: int, owner_id: int) -> None:  # noqa: B027
+        pass
+
+    async def delete_records(self, mailer_ids: Iterable[int]) -> None:
+        for mailer_id in mailer_ids:
+            await self.delete_record(mailer_id=mailer_id)
+
+    async def get_stubs(self) -> AsyncIterable[tuple[int, StorageStub]]:
+        async for mailer_id, record in self.get_records():
+            yield mailer_id, StorageStub.from_record(record=record)
 
     @abstractmethod
     def get_records(self) -> AsyncIterable[tuple[int, StorageRecord]]:
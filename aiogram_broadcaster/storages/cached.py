@@ -0,0 +1,184 @@
+from asyncio import CancelledError, Lock, create_task, sleep
+from collections import defaultdict
+from collections.abc import AsyncGenerator, AsyncIterable, Iterable
+from contextlib import asynccontextmanager, suppress
+from typing import TYPE_CHECKING, Optional
+
+from aiogram_broadcaster.mailer.chats import Chats, ChatState
+from aiogram_broadcaster.utils.logger import logger
+
+from .base import BaseStorage, StorageRecord, StorageStub
+
+
+if TYPE_CHECKING:
+    from asyncio import Task
+
+
+class CachedStorage(BaseStorage):
+    def __init__(self, storage: BaseStorage, flush_interval: Optional[float] = None) -> None:
+        if flush_interval is not None and flush_interval <= 0:
+            raise ValueError("Flush interval must be positive.")
+        if storage.chat_queue:
+            raise ValueError("CachedStorage cannot wrap a storage in chat queue mode.")
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.records: dict[int, StorageRecord] = {}
+        self._pending_records: dict[int, StorageRecord] = {}
+        self._pending_chats: defaultdict[int, dict[int, ChatState]] = defaultdict(dict)
+        self._pending_deletes: set[int] = set()
+        self._flush_lock: Optional[Lock] = None
+        self._flush_task: Optional[Task[None]] = None
+
+    @property
+    def flush_lock(self) -> Lock:
+        if not self._flush_lock:
+            self._flush_lock = Lock()
+        return self._flush_lock
+
+    @asynccontextmanager
+    async def update_record(self, mailer_id: int) -> AsyncGenerator[StorageRecord, None]:
+        cached_record = await self._get_cached_record(mailer_id=mailer_id)
+        record = cached_record.model_copy(deep=True)
+        yield record  # The cache keeps the old record when the block raises.
+        self.records[mailer_id] = record
+        self._pending_records[mailer_id] = record
+        self._pending_chats.pop(mailer_id, None)
+        await self._write()
+
+    async def get_records(self) -> AsyncIterable[tuple[int, StorageRecord]]:
+        await self.flush()
+        async for mailer_id, record in self.storage.get_records():
+            self.records[mailer_id] = record
+            yield mailer_id, record.model_copy(deep=True)
+
+    async def get_stubs(self) -> AsyncIterable[tuple[int, StorageStub]]:
+        await self.flush()
+        async for mailer_id, stub in self.storage.get_stubs():
+            yield mailer_id, stub
+
+    async def set_record(self, mailer_id: int, record: StorageRecord) -> None:
+        record = record.model_copy(deep=True)
+        self.records[mailer_id] = record
+        self._pending_records[mailer_id] = record
+        self._pending_chats.pop(mailer_id, None)
+        self._pending_deletes.discard(mailer_id)
+        await self._write()
+
+    async def get_record(self, mailer_id: int) -> StorageRecord:
+        record = await self._get_cached_record(mailer_id=mailer_id)
+        return record.model_copy(deep=True)
+
+    async def delete_record(self, mailer_id: int) -> None:
+        await self.delete_records(mailer_ids=[mailer_id])
+
+    async def delete_records(self, mailer_ids: Iterable[int]) -> None:
+        for mailer_id in mailer_ids:
+            self.records.pop(mailer_id, None)
+            self._pending_records.pop(mailer_id, None)
+            self._pending_chats.pop(mailer_id, None)
+            self._pending_deletes.add(mailer_id)
+        await self._write()
+
+    async def mark_chats(self, mailer_id: int, state: ChatState, chats: Iterable[int]) -> None:
+        chats = set(chats)
+        if not chats:
+            return
+        record = await self._get_cached_record(mailer_id=mailer_id)
+        record.chats.mark(state=state, chats=chats)
+        if mailer_id not in self._pending_records:
+            self._pending_chats[mailer_id].update(dict.fromkeys(chats, state))
+        await self._write()
+
+    async def get_chat_states(self, mailer_id: int) -> Chats:
+        await self.flush()  # Another owner may have progressed since the record was cached.
+        chats = await self.storage.get_chat_states(mailer_id=mailer_id)
+        if mailer_id in self.records:
+            self.records[mailer_id].chats = chats.model_copy(deep=True)
+        return chats
+
+    async def acquire_lease(self, mailer_id: int, owner_id: int, timeout: float) -> bool:
+        return await self.storage.acquire_lease(
+            mailer_id=mailer_id,
+            owner_id=owner_id,
+            timeout=timeout,
+        )
+
+    async def release_lease(self, mailer_id: int, owner_id: int) -> None:
+        await self.storage.release_lease(mailer_id=mailer_id, owner_id=owner_id)
+
+    async def flush(self) -> None:
+        async with self.flush_lock:
+            records, self._pending_records = self._pending_records, {}
+            chats, self._pending_chats = self._pending_chats, defaultdict(dict)
+            deletes, self._pending_deletes = self._pending_deletes, set()
+            try:
+                await self._flush(records=records, chats=chats, deletes=deletes)
+            except:
+                self._restore(records=records, chats=chats, deletes=deletes)
+                raise
+
+    async def startup(self) -> None:
+        await self.storage.startup()
+        if self.flush_interval is not None:
+            self._flush_task = create_task(coro=self._flush_periodically(self.flush_interval))
+
+    async def shutdown(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            with suppress(CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        await self.flush()
+        await self.storage.shutdown()
+
+    async def _get_cached_record(self, mailer_id: int) -> StorageRecord:
+        if mailer_id not in self.records:
+            self.records[mailer_id] = await self.storage.get_record(mailer_id=mailer_id)
+        return self.records[mailer_id]
+
+    async def _write(self) -> None:
+        if self.flush_interval is None:
+            await self.flush()
+
+    async def _flush_periodically(self, interval: float) -> None:
+        while True:
+            await sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush the cached storage.")
+
+    async def _flush(
+        self,
+        records: dict[int, StorageRecord],
+        chats: dict[int, dict[int, ChatState]],
+        deletes: set[int],
+    ) -> None:
+        if deletes:
+            await self.storage.delete_records(mailer_ids=deletes)
+        for mailer_id, record in records.items():
+            await self.storage.set_record(mailer_id=mailer_id, record=record)
+        for mailer_id, transitions in chats.items():
+            states: defaultdict[ChatState, list[int]] = defaultdict(list)
+            for chat, state in transitions.items():
+                states[state].append(chat)
+            for state, state_chats in states.items():
+                await self.storage.mark_chats(mailer_id=mailer_id, state=state, chats=state_chats)
+
+    def _restore(
+        self,
+        records: dict[int, StorageRecord],
+        chats: dict[int, dict[int, ChatState]],
+        deletes: set[int],
+    ) -> None:
+        for mailer_id in deletes:
+            if mailer_id not in self.records:
+                self._pending_deletes.add(mailer_id)
+        for mailer_id, record in records.items():
+            if mailer_id in self.records and mailer_id not in self._pending_records:
+                self._pending_records[mailer_id] = record
+                self._pending_chats.pop(mailer_id, None)
+        for mailer_id, transitions in chats.items():
+            if mailer_id not in self.records or mailer_id in self._pending_records:
+                continue
+            self._pending_chats[mailer_id] = {**transitions, **self._pending_chats[mailer_id]}
@@ -1,25 +1,65 @@
-from asyncio import Lock
-from collections.abc import AsyncIterable
-from os import PathLike
+from asyncio import Lock, to_thread
+from collections.abc import AsyncIterable, Iterable
+from contextlib import suppress
+from os import (
+    O_RDONLY,
+    PathLike,
+    close,
+    fsync,
+    open as os_open,
+)
 from pathlib import Path
 from typing import Any, Optional, Union
 
 from aiofiles import open
-from pydantic import BaseModel, ConfigDict, Field
+from aiofiles.os import replace
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from aiogram_broadcaster.mailer.chats import ChatState
+from aiogram_broadcaster.utils.logger import logger
 
 from .base import BaseStorage, StorageRecord
 
 
+DEFAULT_JOURNAL_LIMIT = 1000
+JOURNAL_SUFFIX = ".journal"
+TEMPORARY_SUFFIX = ".tmp"
+BACKUP_SUFFIX = ".bak"
+
+
 class StorageRecords(BaseModel):
     model_config = ConfigDict(validate_assignment=True)
 
+    generation: int = 0
     records: dict[int, Any] = Field(default_factory=dict)
 
 
+class JournalEntry(BaseModel):
+    generation: int
+    mailer_id: int
+    state: ChatState
+    chats: list[int]
+
+
 class FileStorage(BaseStorage):
-    def __init__(self, filename: Union[str, PathLike[str], Path] = ".mailers.json") -> None:
+    def __init__(
+        self,
+        filename: Union[str, PathLike[str], Path] = ".mailers.json",
+        *,
+        journal: bool = False,
+        journal_limit: int = DEFAULT_JOURNAL_LIMIT,
+        backup: bool = False,
+    ) -> None:
         self.file = Path(filename)
+        self.journal = journal
+        self.journal_file = self.file.with_name(self.file.name + JOURNAL_SUFFIX)
+        self.journal_limit = journal_limit
+        self.backup = backup
+        self.temporary_file = self.file.with_name(self.file.name + TEMPORARY_SUFFIX)
+        self.backup_file = self.file.with_name(self.file.name + BACKUP_SUFFIX)
         self._lock: Optional[Lock] = None
+        self._generation: Optional[int] = None
+        self._journal_size = 0
 
     @property
     def lock(self) -> Lock:
@@ -30,8 +70,8 @@ class FileStorage(BaseStorage):
     async def get_records(self) -> AsyncIterable[tuple[int, StorageRecord]]:
         async with self.lock:
             records = await self.read_records()
-            for mailer_id, record in records.records.items():
-                yield mailer_id, StorageRecord.model_validate(obj=record)
+        for mailer_id, record in records.records.items():
+            yield mailer_id, StorageRecord.model_validate(obj=record)
 
     async def set_record(self, mailer_id: int, record: StorageRecord) -> None:
         async with self.lock:
@@ -50,24 +90,120 @@ class FileStorage(BaseStorage):
             del records.records[mailer_id]
             await self.write_records(records=records)
 
+    async def delete_records(self, mailer_ids: Iterable[int]) -> None:
+        async with self.lock:
+            records = await self.read_records()
+            for mailer_id in mailer_ids:
+                records.records.pop(mailer_id, None)
+            await self.write_records(records=records)
+
+    async def mark_chats(self, mailer_id: int, state: ChatState, chats: Iterable[int]) -> None:
+        if not self.journal:
+            await super().mark_chats(mailer_id=mailer_id, state=state, chats=chats)
+            return
+        chats = list(set(chats))
+        if not chats:
+            return
+        async with self.lock:
+            if self._generation is None:
+                await self.read_records()
+            entry = JournalEntry(
+                generation=self._generation or 0,
+                mailer_id=mailer_id,
+                state=state,
+                chats=chats,
+            )
+            async with open(file=self.journal_file, mode="a", encoding="utf-8") as file:
+                await file.write(entry.model_dump_json() + "\n")
+            self._journal_size += 1
+            if self._journal_size >= self.journal_limit:
+                await self.write_records(records=await self.read_records())
+
+    async def compact(self) -> None:
+        async with self.lock:
+            await self.write_records(records=await self.read_records())
+
     async def startup(self) -> None:
+        await self.recover_records()
         if self.file.exists():
             if not self.file.is_file():
                 raise RuntimeError(f"The file '{self.file.name}' is not a file.")
             if self.file.stat().st_size > 0:
+                if self.journal and self.journal_file.exists():
+                    await self.compact()
                 return
         records = StorageRecords()
         await self.write_records(records=records)
 
     async def shutdown(self) -> None:
-        pass
+        if self.journal and self._journal_size:
+            await self.compact()
 
     async def read_records(self) -> StorageRecords:
         async with open(file=self.file, encoding="utf-8") as file:
             data = await file.read()
-            return StorageRecords.model_validate_json(json_data=data)
+        records = StorageRecords.model_validate_json(json_data=data)
+        self._generation = records.generation
+        if self.journal:
+            await self.replay_journal(records=records)
+        return records
 
     async def write_records(self, records: StorageRecords) -> None:
-        async with open(file=self.file, mode="w", encoding="utf-8") as file:
+        if self.journal:
+            records.generation += 1
+        async with open(file=self.temporary_file, mode="w", encoding="utf-8") as file:
             data = records.model_dump_json(exclude_defaults=True)
             await file.write(data)
+            await file.flush()
+            await to_thread(fsync, file.fileno())
+        if self.backup and self.file.exists():
+            await replace(self.file, self.backup_file)
+        await replace(self.temporary_file, self.file)
+        await to_thread(self._fsync_directory)
+        self._generation = records.generation
+        if self.journal:
+            async with open(file=self.journal_file, mode="w", encoding="utf-8") as file:
+                await file.truncate()
+            self._journal_size = 0
+
+    async def recover_records(self) -> None:
+        if self.file.exists():
+            return
+        for file in (self.temporary_file, self.backup_file):
+            if file.exists():
+                logger.warning("Recovering the file '%s' from '%s'.", self.file, file)
+                await replace(file, self.file)
+                return
+
+    async def replay_journal(self, records: StorageRecords) -> None:
+        if not self.journal_file.exists():
+            return
+        async with open(file=self.journal_file, encoding="utf-8") as file:
+            lines = await file.readlines()
+        self._journal_size = len(lines)
+        replayed: dict[int, StorageRecord] = {}
+        for line in lines:
+            try:
+                entry = JournalEntry.model_validate_json(json_data=line)
+            except ValidationError:
+                logger.warning("Skipping a corrupted line in the journal '%s'.", self.journal_file)
+                continue
+            if entry.generation != records.generation or entry.mailer_id not in records.records:
+                continue
+            if entry.mailer_id not in replayed:
+                record = StorageRecord.model_validate(obj=records.records[entry.mailer_id])
+                replayed[entry.mailer_id] = record
+            replayed[entry.mailer_id].chats.mark(state=entry.state, chats=entry.chats)
+        for mailer_id, record in replayed.items():
+            records.records[mailer_id] = record.model_dump(mode="json", exclude_defaults=True)
+
+    def _fsync_directory(self) -> None:
+        try:
+            descriptor = os_open(self.file.parent, O_RDONLY)
+        except OSError:  # Directories cannot be opened on Windows.
+            return
+        try:
+            with suppress(OSError):
+                fsync(descriptor)
+        finally:
+            close(descriptor)
@@ -1,15 +1,20 @@
-from collections.abc import AsyncIterable, Mapping
+from collections import defaultdict
+from collections.abc import AsyncIterable, Iterable, Mapping
 from typing import Any, Optional
 
 from typing_extensions import Self
 
+from aiogram_broadcaster.mailer.chats import Chats, ChatState
+from aiogram_broadcaster.utils.batched import batched
 from aiogram_broadcaster.utils.exceptions import DependencyNotFoundError
+from aiogram_broadcaster.utils.id_generator import generate_id
 
-from .base import BaseStorage, StorageRecord
+from .base import BaseStorage, StorageRecord, StorageStub
 
 
 try:
     from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import ASCENDING, UpdateOne
 except ImportError as error:
     raise DependencyNotFoundError(
         feature_name="MongoDBStorage",
@@ -20,6 +25,9 @@ except ImportError as error:
 
 DEFAULT_DATABASE_NAME = "aiogram_broadcaster"
 DEFAULT_COLLECTION_NAME = "mailers"
+CHATS_COLLECTION_SUFFIX = "_chats"
+CHATS_BATCH_SIZE = 1000
+RECORDS_BATCH_SIZE = 100
 
 
 class MongoDBStorage(BaseStorage):
@@ -33,6 +41,9 @@ class MongoDBStorage(BaseStorage):
         self.database_name = database_name
         self.collection_name = collection_name
         self.collection = self.client[self.database_name][self.collection_name]
+        self.chats_collection = self.client[self.database_name][
+            self.collection_name + CHATS_COLLECTION_SUFFIX
+        ]
 
     @classmethod
     def from_url(
@@ -46,28 +57,144 @@ class MongoDBStorage(BaseStorage):
         return cls(client=client, database_name=database_name, collection_name=collection_name)
 
     async def get_records(self) -> AsyncIterable[tuple[int, StorageRecord]]:
-        async for document in self.collection.find():
-            yield document["_id"], StorageRecord.model_validate(obj=document)
+        cursor = self.collection.find(batch_size=RECORDS_BATCH_SIZE)
+        while documents := await cursor.to_list(length=RECORDS_BATCH_SIZE):
+            records = {
+                document["_id"]: StorageRecord.model_validate(obj=document)
+                for document in documents
+            }
+            await self._load_chats(
+                chats={mailer_id: record.chats for mailer_id, record in records.items()},
+            )
+            for mailer_id, record in records.items():
+                yield mailer_id, record
+
+    async def get_stubs(self) -> AsyncIterable[tuple[int, StorageStub]]:
+        counters = {}
+        for state in ChatState:
+            chats_path = "$" + self.build_chats_path(state=state)
+            counters[str(state.value)] = {"$size": {"$ifNull": [chats_path, []]}}
+        projection = {"concurrency": True, "bot_id": True, "context": True, "counters": counters}
+        cursor = self.collection.aggregate([{"$project": projection}])
+        while documents := await cursor.to_list(length=RECORDS_BATCH_SIZE):
+            stubs, legacy_stubs = {}, {}
+            for document in documents:
+                stub = StorageStub.model_validate(obj=document)
+                if any(stub.counters.values()):  # Chats stored inside the record itself.
+                    record = await self.get_record(mailer_id=document["_id"])
+                    legacy_stubs[document["_id"]] = StorageStub.from_record(record=record)
+                else:
+                    stubs[document["_id"]] = stub
+            await self._count_chats(stubs=stubs)
+            for mailer_id, stub in {**stubs, **legacy_stubs}.items():
+                yield mailer_id, stub
 
     async def set_record(self, mailer_id: int, record: StorageRecord) -> None:
-        data = record.model_dump(mode="json", exclude_defaults=True)
+        data = record.model_dump(
+            mode="json",
+            exclude_defaults=True,
+            exclude={"chats": {"registry"}},
+        )
+        # Upsert the current chats before dropping stale ones, so a failure in between
+        # never leaves the record without chats. The revision marks what was written.
+        revision = generate_id()
+        requests = [
+            UpdateOne(
+                filter={"mailer_id": mailer_id, "chat_id": chat_id},
+                update={"$set": {"state": state.value, "revision": revision}},
+                upsert=True,
+            )
+            for state, chats in record.chats.registry.items()
+            for chat_id in chats
+        ]
+        for batch in batched(sequence=requests, size=CHATS_BATCH_SIZE):
+            await self.chats_collection.bulk_write(requests=batch, ordered=False)
         await self.collection.update_one(
             filter={"_id": mailer_id},
-            update={"$set": data},
+            update={"$set": data, "$unset": {"chats.registry": ""}},
             upsert=True,
         )
+        await self.chats_collection.delete_many(
+            filter={"mailer_id": mailer_id, "revision": {"$ne": revision}},
+        )
 
     async def get_record(self, mailer_id: int) -> StorageRecord:
         document = await self.collection.find_one(filter={"_id": mailer_id})
         if not document:
             raise LookupError
-        return StorageRecord.model_validate(obj=document)
+        record = StorageRecord.model_validate(obj=document)
+        await self._load_chats(chats={mailer_id: record.chats})
+        return record
 
     async def delete_record(self, mailer_id: int) -> None:
-        await self.collection.delete_one(filter={"_id": mailer_id})
+        await self.delete_records(mailer_ids=[mailer_id])
+
+    async def delete_records(self, mailer_ids: Iterable[int]) -> None:
+        mailer_ids = list(mailer_ids)
+        await self.collection.delete_many(filter={"_id": {"$in": mailer_ids}})
+        await self.chats_collection.delete_many(filter={"mailer_id": {"$in": mailer_ids}})
+
+    async def mark_chats(self, mailer_id: int, state: ChatState, chats: Iterable[int]) -> None:
+        requests = [
+            UpdateOne(
+                filter={"mailer_id": mailer_id, "chat_id": chat_id},
+                update={"$set": {"state": state.value}},
+                upsert=True,
+            )
+            for chat_id in set(chats)
+        ]
+        for batch in batched(sequence=requests, size=CHATS_BATCH_SIZE):
+            await self.chats_collection.bulk_write(requests=batch, ordered=False)
+
+    async def get_chat_states(self, mailer_id: int) -> Chats:
+        document = await self.collection.find_one(
+            filter={"_id": mailer_id},
+            projection={"chats": True},
+        )
+        if not document:
+            raise LookupError
+        chats = Chats.model_validate(obj=document.get("chats", {}))
+        await self._load_chats(chats={mailer_id: chats})
+        return chats
 
     async def startup(self) -> None:
-        pass
+        await self.chats_collection.create_index(
+            [("mailer_id", ASCENDING), ("chat_id", ASCENDING)],
+            unique=True,
+        )
 
     async def shutdown(self) -> None:
         self.client.close()
+
+    def build_chats_path(self, state: ChatState) -> str:
+        return f"chats.registry.{state.value}"
+
+    async def _load_chats(self, chats: dict[int, Chats]) -> None:
+        if not chats:
+            return
+        cursor = self.chats_collection.find(
+            filter={"mailer_id": {"$in": list(chats)}},
+            projection={"_id": False, "mailer_id": True, "chat_id": True, "state": True},
+            batch_size=CHATS_BATCH_SIZE,
+        )
+        states: defaultdict[tuple[int, ChatState], list[int]] = defaultdict(list)
+        async for document in cursor:
+            states[document["mailer_id"], ChatState(document["state"])].append(document["chat_id"])
+        for (mailer_id, state), state_chats in states.items():
+            chats[mailer_id].mark(state=state, chats=state_chats)
+
+    async def _count_chats(self, stubs: dict[int, StorageStub]) -> None:
+        if not stubs:
+            return
+        pipeline: list[dict[str, Any]] = [
+            {"$match": {"mailer_id": {"$in": list(stubs)}}},
+            {
+                "$group": {
+                    "_id": {"mailer_id": "$mailer_id", "state": "$state"},
+                    "count": {"$sum": 1},
+                },
+            },
+        ]
+        async for document in self.chats_collection.aggregate(pipeline):
+            stub = stubs[document["_id"]["mailer_id"]]
+            stub.counters[ChatState(document["_id"]["state"])] = document["count"]
@@ -1,15 +1,22 @@
-from collections.abc import AsyncIterable, Mapping
+from collections import defaultdict
+from collections.abc import AsyncGenerator, AsyncIterable, Iterable, Mapping
+from contextlib import asynccontextmanager
+from json import loads
+from math import ceil
 from typing import Any, Optional, Union
 
 from typing_extensions import Self
 
+from aiogram_broadcaster.mailer.chats import ChatState
 from aiogram_broadcaster.utils.exceptions import DependencyNotFoundError
 
-from .base import BaseStorage, StorageRecord
+from .base import DEFAULT_CLAIM_TIMEOUT, BaseStorage, StorageRecord, StorageStub
 
 
 try:
     from redis.asyncio import ConnectionPool, Redis
+    from redis.asyncio.client import Pipeline
+    from redis.exceptions import WatchError
 except ImportError as error:
     raise DependencyNotFoundError(
         feature_name="RedisStorage",
@@ -20,6 +27,55 @@ except ImportError as error:
 
 DEFAULT_KEY_PREFIX = "mailer"
 DEFAULT_KEY_SEPERATOR = ":"
+DEFAULT_CLAIM_BATCH_SIZE = 10
+CLAIMS_KEY_SUFFIX = "claimed"
+LEASE_KEY_SUFFIX = "lease"
+RECORDS_BATCH_SIZE = 100
+UPDATE_RECORD_ATTEMPTS = 3
+LEGACY_CHATS_MARKER = "registry"
+READ_RECORD_SCRIPT = """
+local result = {redis.call("GET", KEYS[1])}
+for index = 2, #KEYS do
+    result[index] = redis.call("SMEMBERS", KEYS[index])
+end
+return result
+"""
+CLAIM_CHATS_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+for _, chat in ipairs(redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", now)) do
+    redis.call("ZREM", KEYS[2], chat)
+    redis.call("SADD", KEYS[1], chat)
+end
+local chats = redis.call("SPOP", KEYS[1], ARGV[1])
+for _, chat in ipairs(chats) do
+    redis.call("ZADD", KEYS[2], now + tonumber(ARGV[2]), chat)
+end
+return chats
+"""
+RELEASE_CHATS_SCRIPT = """
+for _, chat in ipairs(ARGV) do
+    if redis.call("ZREM", KEYS[2], chat) == 1 then
+        redis.call("SADD", KEYS[1], chat)
+    end
+end
+"""
+
+ACQUIRE_LEASE_SCRIPT = """
+local owner = redis.call("GET", KEYS[1])
+if owner and owner ~= ARGV[1] then
+    return 0
+end
+redis.call("SET", KEYS[1], ARGV[1], "PX", ARGV[2])
+return 1
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    redis.call("DEL", KEYS[1])
+end
+"""
+
+RecordChanges = tuple[dict[str, Any], dict[Optional[ChatState], set[int]]]
 
 
 class RedisStorage(BaseStorage):
@@ -28,10 +84,26 @@ class RedisStorage(BaseStorage):
         redis: Redis,
         key_prefix: str = DEFAULT_KEY_PREFIX,
         key_seperator: str = DEFAULT_KEY_SEPERATOR,
+        *,
+        chat_queue: bool = False,
+        claim_timeout: float = DEFAULT_CLAIM_TIMEOUT,
+        claim_batch_size: int = DEFAULT_CLAIM_BATCH_SIZE,
     ) -> None:
+        if claim_timeout <= 0:
+            raise ValueError("Claim timeout must be positive.")
+        if claim_batch_size < 1:
+            raise ValueError("Claim batch size must be at least one.")
         self.redis = redis
         self.key_prefix = key_prefix
         self.key_seperator = key_seperator
+        self.chat_queue = chat_queue
+        self.claim_timeout = claim_timeout
+        self.claim_batch_size = claim_batch_size
+        self.read_record_script = self.redis.register_script(script=READ_RECORD_SCRIPT)
+        self.claim_chats_script = self.redis.register_script(script=CLAIM_CHATS_SCRIPT)
+        self.release_chats_script = self.redis.register_script(script=RELEASE_CHATS_SCRIPT)
+        self.acquire_lease_script = self.redis.register_script(script=ACQUIRE_LEASE_SCRIPT)
+        self.release_lease_script = self.redis.register_script(script=RELEASE_LEASE_SCRIPT)
 
     @classmethod
     def from_connection_pool(
@@ -39,9 +111,20 @@ class RedisStorage(BaseStorage):
         connection_pool: ConnectionPool,
         key_prefix: str = DEFAULT_KEY_PREFIX,
         key_seperator: str = DEFAULT_KEY_SEPERATOR,
+        *,
+        chat_queue: bool = False,
+        claim_timeout: float = DEFAULT_CLAIM_TIMEOUT,
+        claim_batch_size: int = DEFAULT_CLAIM_BATCH_SIZE,
     ) -> Self:
         redis = Redis.from_pool(connection_pool=connection_pool)
-        return cls(redis=redis, key_prefix=key_prefix, key_seperator=key_seperator)
+        return cls(
+            redis=redis,
+            key_prefix=key_prefix,
+            key_seperator=key_seperator,
+            chat_queue=chat_queue,
+            claim_timeout=claim_timeout,
+            claim_batch_size=claim_batch_size,
+        )
 
     @classmethod
     def from_url(
@@ -50,30 +133,171 @@ class RedisStorage(BaseStorage):
         connection_options: Optional[Mapping[str, Any]] = None,
         key_prefix: str = DEFAULT_KEY_PREFIX,
         key_seperator: str = DEFAULT_KEY_SEPERATOR,
+        *,
+        chat_queue: bool = False,
+        claim_timeout: float = DEFAULT_CLAIM_TIMEOUT,
+        claim_batch_size: int = DEFAULT_CLAIM_BATCH_SIZE,
     ) -> Self:
         connection_pool = ConnectionPool.from_url(url=url, **(connection_options or {}))
         redis = Redis(connection_pool=connection_pool)
-        return cls(redis=redis, key_prefix=key_prefix, key_seperator=key_seperator)
+        return cls(
+            redis=redis,
+            key_prefix=key_prefix,
+            key_seperator=key_seperator,
+            chat_queue=chat_queue,
+            claim_timeout=claim_timeout,
+            claim_batch_size=claim_batch_size,
+        )
+
+    @asynccontextmanager
+    async def update_record(self, mailer_id: int) -> AsyncGenerator[StorageRecord, None]:
+        keys = self.build_record_keys(mailer_id=mailer_id)
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            record = await self._watch_record(pipeline=pipeline, keys=keys)
+            original = record.model_copy(deep=True)
+            yield record
+            changes: Optional[RecordChanges] = None
+            for attempt in range(1, UPDATE_RECORD_ATTEMPTS + 1):
+                pipeline.multi()  # type: ignore[no-untyped-call]
+                self._write_record(pipeline=pipeline, mailer_id=mailer_id, record=record)
+                try:
+                    await pipeline.execute()
+                except WatchError:
+                    if attempt == UPDATE_RECORD_ATTEMPTS:
+                        raise
+                    # Replay the changes made in the block onto the concurrently updated record.
+                    changes = changes or self._diff_record(original=original, record=record)
+                    record = await self._watch_record(pipeline=pipeline, keys=keys)
+                    self._apply_changes(record=record, changes=changes)
+                else:
+                    return
 
     async def get_records(self) -> AsyncIterable[tuple[int, StorageRecord]]:
-        pattern = self.build_key()
-        keys = await self.redis.keys(pattern=pattern)
-        for mailer_id in map(self.parse_key, keys):
-            yield mailer_id, await self.get_record(mailer_id=mailer_id)
+        async for mailer_ids in self._scan_mailer_ids():
+            for record in await self._get_records(mailer_ids=mailer_ids):
+                yield record
+
+    async def get_stubs(self) -> AsyncIterable[tuple[int, StorageStub]]:
+        async for mailer_ids in self._scan_mailer_ids():
+            for stub in await self._get_stubs(mailer_ids=mailer_ids):
+                yield stub
 
     async def set_record(self, mailer_id: int, record: StorageRecord) -> None:
-        key = self.build_key(mailer_id=mailer_id)
-        data = record.model_dump_json(exclude_defaults=True)
-        await self.redis.set(name=key, value=data)
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            self._write_record(pipeline=pipeline, mailer_id=mailer_id, record=record)
+            await pipeline.execute()
 
     async def get_record(self, mailer_id: int) -> StorageRecord:
-        key = self.build_key(mailer_id=mailer_id)
-        data = await self.redis.get(name=key)
+        records = await self._get_records(mailer_ids=[mailer_id])
+        if not records:
+            raise LookupError
+        return records[0][1]
+
+    async def get_bare_record(self, mailer_id: int) -> StorageRecord:
+        data = await self.redis.get(name=self.build_key(mailer_id=mailer_id))
+        if data is None:
+            raise LookupError
         return StorageRecord.model_validate_json(json_data=data)
 
+    async def claim_chats(self, mailer_id: int, count: int) -> list[int]:
+        keys = [
+            self.build_key(mailer_id=mailer_id, state=ChatState.PENDING),
+            self.build_claims_key(mailer_id=mailer_id),
+        ]
+        args = [count, self.claim_timeout]
+        chats = await self.claim_chats_script(keys=keys, args=args)
+        return [int(chat) for chat in chats]
+
+    async def release_chats(self, mailer_id: int, chats: Iterable[int]) -> None:
+        chats = list(chats)
+        if not chats:
+            return
+        keys = [
+            self.build_key(mailer_id=mailer_id, state=ChatState.PENDING),
+            self.build_claims_key(mailer_id=mailer_id),
+        ]
+        await self.release_chats_script(keys=keys, args=chats)
+
+    async def count_chats(self, mailer_id: int) -> dict[ChatState, int]:
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            for state in ChatState:
+                pipeline.scard(name=self.build_key(mailer_id=mailer_id, state=state))
+            pipeline.zcard(name=self.build_claims_key(mailer_id=mailer_id))
+            *states, claimed = await pipeline.execute()
+        counters: dict[ChatState, int] = dict(zip(ChatState, states))
+        counters[ChatState.PENDING] += claimed
+        return counters
+
+    async def extend_chats(self, mailer_id: int, chats: Iterable[int]) -> set[int]:
+        chats = list(set(chats))
+        if not chats:
+            return set()
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            for state in ChatState:
+                pipeline.smismember(self.build_key(mailer_id=mailer_id, state=state), chats)
+            pipeline.zmscore(self.build_claims_key(mailer_id=mailer_id), list(map(str, chats)))
+            *states, claimed = await pipeline.execute()
+        difference = {
+            chat
+            for chat, claim, *exists in zip(chats, claimed, *states)
+            if claim is None and not any(exists)
+        }
+        if difference:
+            key = self.build_key(mailer_id=mailer_id, state=ChatState.PENDING)
+            await self.redis.sadd(key, *difference)  # type: ignore[misc]
+        return difference
+
+    async def reset_chats(self, mailer_id: int) -> None:
+        keys = self.build_record_keys(mailer_id=mailer_id)[1:]
+        pending_key = self.build_key(mailer_id=mailer_id, state=ChatState.PENDING)
+        processed_keys = [key for key in keys if key != pending_key]
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            pipeline.sunionstore(pending_key, keys)
+            pipeline.delete(*processed_keys)
+            await pipeline.execute()
+
+    async def acquire_lease(self, mailer_id: int, owner_id: int, timeout: float) -> bool:
+        acquired = await self.acquire_lease_script(
+            keys=[self.build_lease_key(mailer_id=mailer_id)],
+            args=[owner_id, ceil(timeout * 1000)],
+        )
+        return bool(acquired)
+
+    async def release_lease(self, mailer_id: int, owner_id: int) -> None:
+        await self.release_lease_script(
+            keys=[self.build_lease_key(mailer_id=mailer_id)],
+            args=[owner_id],
+        )
+
     async def delete_record(self, mailer_id: int) -> None:
-        key = self.build_key(mailer_id=mailer_id)
-        await self.redis.delete(key)
+        await self.delete_records(mailer_ids=[mailer_id])
+
+    async def delete_records(self, mailer_ids: Iterable[int]) -> None:
+        keys = []
+        for mailer_id in mailer_ids:
+            keys.extend(self.build_record_keys(mailer_id=mailer_id))
+            keys.extend(
+                (
+                    self.build_claims_key(mailer_id=mailer_id),
+                    self.build_lease_key(mailer_id=mailer_id),
+                ),
+            )
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def mark_chats(self, mailer_id: int, state: ChatState, chats: Iterable[int]) -> None:
+        chats = set(chats)
+        if not chats:
+            return
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            for chats_state in ChatState:
+                if chats_state is not state:
+                    state_key = self.build_key(mailer_id=mailer_id, state=chats_state)
+                    pipeline.srem(state_key, *chats)
+            pipeline.sadd(self.build_key(mailer_id=mailer_id, state=state), *chats)
+            if self.chat_queue:
+                pipeline.zrem(self.build_claims_key(mailer_id=mailer_id), *chats)
+            await pipeline.execute()
 
     async def startup(self) -> None:
         pass
@@ -81,11 +305,140 @@ class RedisStorage(BaseStorage):
     async def shutdown(self) -> None:
         await self.redis.aclose(close_connection_pool=True)
 
-    def build_key(self, mailer_id: Optional[int] = None) -> str:
-        key = (self.key_prefix, str(mailer_id or "*"))
+    def build_key(self, mailer_id: Optional[int] = None, state: Optional[ChatState] = None) -> str:
+        key = [self.key_prefix, str(mailer_id or "*")]
+        if state:
+            key.append(state.name.lower())
         return self.key_seperator.join(key)
 
-    def parse_key(self, key: Union[bytes, str]) -> int:
+    def build_claims_key(self, mailer_id: int) -> str:
+        return self.key_seperator.join([self.key_prefix, str(mailer_id), CLAIMS_KEY_SUFFIX])
+
+    def build_lease_key(self, mailer_id: int) -> str:
+        return self.key_seperator.join([self.key_prefix, str(mailer_id), LEASE_KEY_SUFFIX])
+
+    def build_record_keys(self, mailer_id: int) -> list[str]:
+        keys = [self.build_key(mailer_id=mailer_id, state=state) for state in ChatState]
+        return [self.build_key(mailer_id=mailer_id), *keys]
+
+    def parse_key(self, key: Union[bytes, str]) -> Optional[int]:
         key_string = key.decode() if isinstance(key, bytes) else key
-        _, mailer_id = key_string.split(self.key_seperator)
-        return int(mailer_id)
+        parts = key_string.split(self.key_seperator)
+        if len(parts) != 2:  # noqa: PLR2004
+            return None
+        return int(parts[1])
+
+    async def _get_records(self, mailer_ids: list[int]) -> list[tuple[int, StorageRecord]]:
+        if not mailer_ids:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.mget(keys=[self.build_key(mailer_id=mailer_id) for mailer_id in mailer_ids])
+            for mailer_id in mailer_ids:
+                for state in ChatState:
+                    pipeline.smembers(name=self.build_key(mailer_id=mailer_id, state=state))
+            data, *states = await pipeline.execute()
+        records = []
+        for index, mailer_id in enumerate(mailer_ids):
+            if data[index] is None:
+                continue
+            mailer_states = states[index * len(ChatState) : (index + 1) * len(ChatState)]
+            record = self._build_record(data=data[index], states=mailer_states)
+            records.append((mailer_id, record))
+        return records
+
+    async def _watch_record(self, pipeline: Pipeline, keys: list[str]) -> StorageRecord:
+        await pipeline.watch(*keys)
+        data, *states = await self.read_record_script(keys=keys, client=pipeline)
+        if data is None:
+            raise LookupError
+        return self._build_record(data=data, states=states)
+
+    def _diff_record(self, original: StorageRecord, record: StorageRecord) -> RecordChanges:
+        fields = {
+            name: getattr(record, name)
+            for name in StorageRecord.model_fields.keys() - {"chats"}
+            if getattr(record, name) != getattr(original, name)
+        }
+        states = {chat: state for state in ChatState for chat in original.chats.registry[state]}
+        transitions: defaultdict[Optional[ChatState], set[int]] = defaultdict(set)
+        for state in ChatState:
+            for chat in record.chats.registry[state]:
+                if states.pop(chat, None) is not state:
+                    transitions[state].add(chat)
+        if states:  # Removed from the record altogether
+            transitions[None].update(states)
+        return fields, dict(transitions)
+
+    def _apply_changes(self, record: StorageRecord, changes: RecordChanges) -> None:
+        fields, transitions = changes
+        for name, value in fields.items():
+            setattr(record, name, value)
+        for state, chats in transitions.items():
+            if state is not None:
+                record.chats.mark(state=state, chats=chats)
+                continue
+            for chats_state in ChatState:
+                record.chats.registry[chats_state].difference_update(chats)
+
+    def _build_record(self, data: bytes, states: list[set[bytes]]) -> StorageRecord:
+        record = StorageRecord.model_validate_json(json_data=data)
+        for state, chats in zip(ChatState, states):
+            record.chats.mark(state=state, chats=map(int, chats))
+        return record
+
+    def _write_record(self, pipeline: Pipeline, mailer_id: int, record: StorageRecord) -> None:
+        data = record.model_dump_json(exclude_defaults=True, exclude={"chats": {"registry"}})
+        pipeline.set(name=self.build_key(mailer_id=mailer_id), value=data)
+        for state in ChatState:
+            state_key = self.build_key(mailer_id=mailer_id, state=state)
+            pipeline.delete(state_key)
+            if chats := record.chats.registry[state]:
+                pipeline.sadd(state_key, *chats)
+
+    async def _get_stubs(self, mailer_ids: list[int]) -> list[tuple[int, StorageStub]]:
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.mget(keys=[self.build_key(mailer_id=mailer_id) for mailer_id in mailer_ids])
+            for mailer_id in mailer_ids:
+                for state in ChatState:
+                    pipeline.scard(name=self.build_key(mailer_id=mailer_id, state=state))
+                pipeline.zcard(name=self.build_claims_key(mailer_id=mailer_id))
+            data, *counters = await pipeline.execute()
+        stubs = []
+        size = len(ChatState) + 1
+        for index, mailer_id in enumerate(mailer_ids):
+            if data[index] is None:
+                continue
+            if self._is_legacy(data=data[index]):  # Chats stored inside the record itself.
+                record = await self._migrate_record(mailer_id=mailer_id)
+                stubs.append((mailer_id, StorageStub.from_record(record=record)))
+                continue
+            stub = StorageStub.model_validate_json(json_data=data[index])
+            *mailer_counters, claimed = counters[index * size : (index + 1) * size]
+            stub.counters = dict(zip(ChatState, mailer_counters))
+            stub.counters[ChatState.PENDING] += claimed
+            stubs.append((mailer_id, stub))
+        return stubs
+
+    async def _migrate_record(self, mailer_id: int) -> StorageRecord:
+        async with self.update_record(mailer_id=mailer_id) as record:
+            pass  # Written back with the chats moved into the per-state sets.
+        return record
+
+    def _is_legacy(self, data: Union[bytes, str]) -> bool:
+        return LEGACY_CHATS_MARKER in loads(data).get("chats", {})
+
+    async def _scan_mailer_ids(self) -> AsyncIterable[list[int]]:
+        pattern = self.build_key()
+        mailer_ids: list[int] = []
+        seen_mailer_ids: set[int] = set()
+        async for key in self.redis.scan_iter(match=pattern, count=RECORDS_BATCH_SIZE):
+            mailer_id = self.parse_key(key=key)
+            if mailer_id is None or mailer_id in seen_mailer_ids:
+                continue
+            seen_mailer_ids.add(mailer_id)
+            mailer_ids.append(mailer_id)
+            if len(mailer_ids) >= RECORDS_BATCH_SIZE:
+                yield mailer_ids
+                mailer_ids = []
+        if mailer_ids:
+            yield mailer_ids
@@ -1,26 +1,44 @@
-from collections.abc import AsyncIterable, Mapping
-from typing import Any, Optional, Union, cast
+from collections import defaultdict
+from collections.abc import AsyncIterable, Callable, Iterable, Mapping
+from json import loads
+from time import time
+from typing import TYPE_CHECKING, Any, Optional, TypeVar, Union, cast
 
+from pydantic import BaseModel
 from typing_extensions import Self
 
+from aiogram_broadcaster.mailer.chats import Chats, ChatState
+from aiogram_broadcaster.utils.batched import batched
 from aiogram_broadcaster.utils.exceptions import DependencyNotFoundError
+from aiogram_broadcaster.utils.id_generator import generate_id
 
-from .base import BaseStorage, StorageRecord
+from .base import DEFAULT_CLAIM_TIMEOUT, BaseStorage, StorageRecord, StorageStub
 
 
 try:
     from sqlalchemy import (
+        JSON,
         URL,
         BigInteger,
         Column,
+        Float,
         MetaData,
+        SmallInteger,
         String,
         Table,
         delete,
+        func,
         insert,
+        or_,
         select,
         update,
     )
+    from sqlalchemy.dialects.mysql import insert as mysql_insert
+    from sqlalchemy.dialects.postgresql import (
+        JSONB,
+        insert as postgresql_insert,
+    )
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
     from sqlalchemy.exc import IntegrityError
     from sqlalchemy.ext.asyncio import (
         AsyncEngine,
@@ -36,7 +54,27 @@ except ImportError as error:
     ) from error
 
 
+if TYPE_CHECKING:
+    from sqlalchemy import CursorResult, Insert
+    from sqlalchemy.dialects.postgresql import Insert as PostgreSQLInsert
+    from sqlalchemy.dialects.sqlite import Insert as SQLiteInsert
+
+
 DEFAULT_TABLE_NAME = "aiogram_broadcaster"
+CHATS_TABLE_SUFFIX = "_chats"
+LEASES_TABLE_SUFFIX = "_leases"
+CHATS_BATCH_SIZE = 1000
+RECORDS_BATCH_SIZE = 100
+DEFAULT_CLAIM_BATCH_SIZE = 10
+LEGACY_CHATS_MARKER = "registry"
+
+ON_CONFLICT_INSERTS: dict[str, Callable[[Table], Union["PostgreSQLInsert", "SQLiteInsert"]]] = {
+    "postgresql": postgresql_insert,
+    "sqlite": sqlite_insert,
+}
+ON_DUPLICATE_KEY_DIALECTS = frozenset({"mysql", "mariadb"})
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
 
 
 class SQLAlchemyStorage(BaseStorage):
@@ -44,13 +82,27 @@ class SQLAlchemyStorage(BaseStorage):
         self,
         session_maker: async_sessionmaker[AsyncSession],
         table_name: str = DEFAULT_TABLE_NAME,
+        *,
+        chat_queue: bool = False,
+        claim_timeout: float = DEFAULT_CLAIM_TIMEOUT,
+        claim_batch_size: int = DEFAULT_CLAIM_BATCH_SIZE,
+        native_json: bool = False,
     ) -> None:
+        if claim_timeout <= 0:
+            raise ValueError("Claim timeout must be positive.")
+        if claim_batch_size < 1:
+            raise ValueError("Claim batch size must be at least one.")
         self.session_maker = session_maker
         self.table_name = table_name
+        self.chat_queue = chat_queue
+        self.claim_timeout = claim_timeout
+        self.claim_batch_size = claim_batch_size
+        self.native_json = native_json
 
+        self.metadata = MetaData()
         self.table = Table(
             table_name,
-            MetaData(),
+            self.metadata,
             Column(
                 "id",
                 BigInteger(),
@@ -61,7 +113,58 @@ class SQLAlchemyStorage(BaseStorage):
             ),
             Column(
                 "data",
-                String(),
+                JSON().with_variant(JSONB(), "postgresql") if native_json else String(),
+                nullable=False,
+            ),
+        )
+        self.chats_table = Table(
+            table_name + CHATS_TABLE_SUFFIX,
+            self.metadata,
+            Column(
+                "mailer_id",
+                BigInteger(),
+                nullable=False,
+                primary_key=True,
+            ),
+            Column(
+                "chat_id",
+                BigInteger(),
+                nullable=False,
+                primary_key=True,
+            ),
+            Column(
+                "state",
+                SmallInteger(),
+                nullable=False,
+            ),
+            Column(
+                "claimed_until",
+                Float(),
+                nullable=True,
+            ),
+            Column(
+                "claim_id",
+                BigInteger(),
+                nullable=True,
+            ),
+        )
+        self.leases_table = Table(
+            table_name + LEASES_TABLE_SUFFIX,
+            self.metadata,
+            Column(
+                "mailer_id",
+                BigInteger(),
+                nullable=False,
+                primary_key=True,
+            ),
+            Column(
+                "owner_id",
+                BigInteger(),
+                nullable=False,
+            ),
+            Column(
+                "leased_until",
+                Float(),
                 nullable=False,
             ),
         )
@@ -72,9 +175,21 @@ class SQLAlchemyStorage(BaseStorage):
         engine: AsyncEngine,
         session_options: Optional[Mapping[str, Any]] = None,
         table_name: str = DEFAULT_TABLE_NAME,
+        *,
+        chat_queue: bool = False,
+        claim_timeout: float = DEFAULT_CLAIM_TIMEOUT,
+        claim_batch_size: int = DEFAULT_CLAIM_BATCH_SIZE,
+        native_json: bool = False,
     ) -> Self:
         session_maker = async_sessionmaker(bind=engine, **(session_options or {}))
-        return cls(session_maker=session_maker, table_name=table_name)
+        return cls(
+            session_maker=session_maker,
+            table_name=table_name,
+            chat_queue=chat_queue,
+            claim_timeout=claim_timeout,
+            claim_batch_size=claim_batch_size,
+            native_json=native_json,
+        )
 
     @classmethod
     def from_url(
@@ -83,50 +198,406 @@ class SQLAlchemyStorage(BaseStorage):
         engine_options: Optional[Mapping[str, Any]] = None,
         session_options: Optional[Mapping[str, Any]] = None,
         table_name: str = DEFAULT_TABLE_NAME,
+        *,
+        chat_queue: bool = False,
+        claim_timeout: float = DEFAULT_CLAIM_TIMEOUT,
+        claim_batch_size: int = DEFAULT_CLAIM_BATCH_SIZE,
+        native_json: bool = False,
     ) -> Self:
         engine = create_async_engine(url=url, **(engine_options or {}))
         session_maker = async_sessionmaker(bind=engine, **(session_options or {}))
-        return cls(session_maker=session_maker, table_name=table_name)
+        return cls(
+            session_maker=session_maker,
+            table_name=table_name,
+            chat_queue=chat_queue,
+            claim_timeout=claim_timeout,
+            claim_batch_size=claim_batch_size,
+            native_json=native_json,
+        )
 
     @property
     def engine(self) -> AsyncEngine:
         return cast("AsyncEngine", self.session_maker.kw["bind"])
 
     async def get_records(self) -> AsyncIterable[tuple[int, StorageRecord]]:
-        statement = select(self.table)
+        statement = select(self.table.c.id, self.table.c.data).execution_options(
+            yield_per=RECORDS_BATCH_SIZE,
+        )
         async with self.session_maker() as session:
-            result = await session.execute(statement=statement)
-        for mailer_id, data in result.all():
-            yield mailer_id, StorageRecord.model_validate_json(json_data=data)
+            result = await session.stream(statement=statement)
+            async for partition in result.partitions():
+                records = {
+                    mailer_id: self._load_data(model=StorageRecord, data=data)
+                    for mailer_id, data in partition
+                }
+                await self._load_chats(records=records)
+                for mailer_id, record in records.items():
+                    yield mailer_id, record
+
+    async def get_stubs(self) -> AsyncIterable[tuple[int, StorageStub]]:
+        statement = select(self.table.c.id, self.table.c.data).execution_options(
+            yield_per=RECORDS_BATCH_SIZE,
+        )
+        async with self.session_maker() as session:
+            result = await session.stream(statement=statement)
+            async for partition in result.partitions():
+                stubs, legacy_stubs = {}, {}
+                for mailer_id, data in partition:
+                    if self._is_legacy(data=data):  # Chats stored inside the record itself.
+                        record = await self._migrate_record(mailer_id=mailer_id)
+                        legacy_stubs[mailer_id] = StorageStub.from_record(record=record)
+                    else:
+                        stubs[mailer_id] = self._load_data(model=StorageStub, data=data)
+                await self._count_chats(stubs=stubs)
+                for mailer_id, stub in {**stubs, **legacy_stubs}.items():
+                    yield mailer_id, stub
 
     async def set_record(self, mailer_id: int, record: StorageRecord) -> None:
-        data = record.model_dump_json(exclude_defaults=True)
-        insert_statement = insert(self.table).values(id=mailer_id, data=data)
-        update_statement = update(self.table).where(self.table.c.id == mailer_id).values(data=data)
-        async with self.session_maker() as session:
-            try:
-                await session.execute(statement=insert_statement)
-            except IntegrityError:
-                await session.rollback()
-                await session.execute(statement=update_statement)
+        data = self._dump_data(record=record)
+        upsert_statement = self._build_upsert(table=self.table, keys=("id",), columns=("data",))
+        delete_chats_statement = delete(self.chats_table).where(
+            self.chats_table.c.mailer_id == mailer_id,
+        )
+        async with self.session_maker() as session:
+            if upsert_statement is not None:
+                await session.execute(statement=upsert_statement.values(id=mailer_id, data=data))
+            else:
+                insert_statement = insert(self.table).values(id=mailer_id, data=data)
+                update_statement = (
+                    update(self.table).where(self.table.c.id == mailer_id).values(data=data)
+                )
+                try:
+                    await session.execute(statement=insert_statement)
+                except IntegrityError:
+                    await session.rollback()
+                    await session.execute(statement=update_statement)
+            await session.execute(statement=delete_chats_statement)
+            for state, chats in record.chats.registry.items():
+                await self._insert_chats(
+                    session=session,
+                    mailer_id=mailer_id,
+                    state=state,
+                    chats=chats,
+                )
             await session.commit()
 
     async def get_record(self, mailer_id: int) -> StorageRecord:
         statement = select(self.table.c.data).where(self.table.c.id == mailer_id)
         async with self.session_maker() as session:
             result = await session.execute(statement=statement)
-        data = result.scalar_one()
-        return StorageRecord.model_validate_json(json_data=data)
+        record = self._load_data(model=StorageRecord, data=result.scalar_one())
+        await self._load_chats(records={mailer_id: record})
+        return record
 
-    async def delete_record(self, mailer_id: int) -> None:
-        statement = delete(self.table).where(self.table.c.id == mailer_id)
+    async def get_bare_record(self, mailer_id: int) -> StorageRecord:
+        statement = select(self.table.c.data).where(self.table.c.id == mailer_id)
+        async with self.session_maker() as session:
+            result = await session.execute(statement=statement)
+        record = self._load_data(model=StorageRecord, data=result.scalar_one())
+        record.chats = Chats(compact=record.chats.compact)
+        return record
+
+    async def claim_chats(self, mailer_id: int, count: int) -> list[int]:
+        while True:
+            now = time()
+            claim_id = generate_id()
+            claimable = (
+                self.chats_table.c.mailer_id == mailer_id,
+                self.chats_table.c.state == ChatState.PENDING,
+                or_(
+                    self.chats_table.c.claimed_until.is_(None),
+                    self.chats_table.c.claimed_until <= now,
+                ),
+            )
+            candidates = select(self.chats_table.c.chat_id).where(*claimable).limit(count)
+            # MySQL rejects LIMIT in an IN subquery and subqueries on the updated table,
+            # so the candidates are wrapped in a derived table.
+            derived = candidates.subquery(name="candidates")
+            statement = (
+                update(self.chats_table)
+                .where(*claimable, self.chats_table.c.chat_id.in_(select(derived.c.chat_id)))
+                .values(claimed_until=now + self.claim_timeout, claim_id=claim_id)
+            )
+            claimed_statement = select(self.chats_table.c.chat_id).where(
+                self.chats_table.c.mailer_id == mailer_id,
+                self.chats_table.c.claim_id == claim_id,
+            )
+            async with self.session_maker() as session:
+                await session.execute(statement=statement)
+                result = await session.execute(statement=claimed_statement)
+                chats = list(result.scalars().all())
+                if not chats:  # Candidates may have been taken by a concurrent claim.
+                    result = await session.execute(statement=candidates.limit(1))
+                    if result.first():
+                        continue
+                await session.commit()
+            return chats
+
+    async def release_chats(self, mailer_id: int, chats: Iterable[int]) -> None:
+        async with self.session_maker() as session:
+            for batch in batched(sequence=list(chats), size=CHATS_BATCH_SIZE):
+                statement = (
+                    update(self.chats_table)
+                    .where(
+                        self.chats_table.c.mailer_id == mailer_id,
+                        self.chats_table.c.chat_id.in_(batch),
+                        self.chats_table.c.state == ChatState.PENDING,
+                    )
+                    .values(claimed_until=None, claim_id=None)
+                )
+                await session.execute(statement=statement)
+            await session.commit()
+
+    async def count_chats(self, mailer_id: int) -> dict[ChatState, int]:
+        statement = (
+            select(self.chats_table.c.state, func.count())
+            .where(self.chats_table.c.mailer_id == mailer_id)
+            .group_by(self.chats_table.c.state)
+        )
+        async with self.session_maker() as session:
+            result = await session.execute(statement=statement)
+        counters = dict.fromkeys(ChatState, 0)
+        for state, count in result.all():
+            counters[ChatState(state)] = count
+        return counters
+
+    async def extend_chats(self, mailer_id: int, chats: Iterable[int]) -> set[int]:
+        difference = set(chats)
+        async with self.session_maker() as session:
+            for batch in batched(sequence=list(difference), size=CHATS_BATCH_SIZE):
+                statement = select(self.chats_table.c.chat_id).where(
+                    self.chats_table.c.mailer_id == mailer_id,
+                    self.chats_table.c.chat_id.in_(batch),
+                )
+                result = await session.execute(statement=statement)
+                difference.difference_update(result.scalars().all())
+            await self._insert_chats(
+                session=session,
+                mailer_id=mailer_id,
+                state=ChatState.PENDING,
+                chats=difference,
+            )
+            await session.commit()
+        return difference
+
+    async def reset_chats(self, mailer_id: int) -> None:
+        statement = (
+            update(self.chats_table)
+            .where(
+                self.chats_table.c.mailer_id == mailer_id,
+                self.chats_table.c.state != ChatState.PENDING,
+            )
+            .values(state=ChatState.PENDING, claimed_until=None, claim_id=None)
+        )
         async with self.session_maker() as session:
             await session.execute(statement=statement)
             await session.commit()
 
+    async def acquire_lease(self, mailer_id: int, owner_id: int, timeout: float) -> bool:
+        now = time()
+        update_statement = (
+            update(self.leases_table)
+            .where(
+                self.leases_table.c.mailer_id == mailer_id,
+                or_(
+                    self.leases_table.c.owner_id == owner_id,
+                    self.leases_table.c.leased_until <= now,
+                ),
+            )
+            .values(owner_id=owner_id, leased_until=now + timeout)
+        )
+        insert_statement = insert(self.leases_table).values(
+            mailer_id=mailer_id,
+            owner_id=owner_id,
+            leased_until=now + timeout,
+        )
+        async with self.session_maker() as session:
+            result = cast("CursorResult[Any]", await session.execute(statement=update_statement))
+            if not result.rowcount:
+                try:
+                    await session.execute(statement=insert_statement)
+                except IntegrityError:  # Leased by another owner.
+                    await session.rollback()
+                    return False
+            await session.commit()
+        return True
+
+    async def release_lease(self, mailer_id: int, owner_id: int) -> None:
+        statement = delete(self.leases_table).where(
+            self.leases_table.c.mailer_id == mailer_id,
+            self.leases_table.c.owner_id == owner_id,
+        )
+        async with self.session_maker() as session:
+            await session.execute(statement=statement)
+            await session.commit()
+
+    async def delete_record(self, mailer_id: int) -> None:
+        await self.delete_records(mailer_ids=[mailer_id])
+
+    async def delete_records(self, mailer_ids: Iterable[int]) -> None:
+        async with self.session_maker() as session:
+            for batch in batched(sequence=list(mailer_ids), size=CHATS_BATCH_SIZE):
+                statement = delete(self.table).where(self.table.c.id.in_(batch))
+                chats_statement = delete(self.chats_table).where(
+                    self.chats_table.c.mailer_id.in_(batch),
+                )
+                leases_statement = delete(self.leases_table).where(
+                    self.leases_table.c.mailer_id.in_(batch),
+                )
+                await session.execute(statement=statement)
+                await session.execute(statement=chats_statement)
+                await session.execute(statement=leases_statement)
+            await session.commit()
+
+    async def mark_chats(self, mailer_id: int, state: ChatState, chats: Iterable[int]) -> None:
+        chats = set(chats)
+        if not chats:
+            return
+        upsert_statement = self._build_upsert(
+            table=self.chats_table,
+            keys=("mailer_id", "chat_id"),
+            columns=("state", "claimed_until", "claim_id"),
+        )
+        async with self.session_maker() as session:
+            if upsert_statement is not None:
+                rows = [
+                    {
+                        "mailer_id": mailer_id,
+                        "chat_id": chat_id,
+                        "state": state,
+                        "claimed_until": None,
+                        "claim_id": None,
+                    }
+                    for chat_id in chats
+                ]
+                for rows_batch in batched(sequence=rows, size=CHATS_BATCH_SIZE):
+                    await session.execute(upsert_statement, rows_batch)
+                await session.commit()
+                return
+            for batch in batched(sequence=list(chats), size=CHATS_BATCH_SIZE):
+                statement = delete(self.chats_table).where(
+                    self.chats_table.c.mailer_id == mailer_id,
+                    self.chats_table.c.chat_id.in_(batch),
+                )
+                await session.execute(statement=statement)
+            await self._insert_chats(
+                session=session,
+                mailer_id=mailer_id,
+                state=state,
+                chats=chats,
+            )
+            await session.commit()
+
     async def startup(self) -> None:
         async with self.engine.begin() as connection:
-            await connection.run_sync(self.table.create, checkfirst=True)
+            await connection.run_sync(self.metadata.create_all, checkfirst=True)
 
     async def shutdown(self) -> None:
         await self.engine.dispose()
+
+    def _build_upsert(
+        self,
+        table: Table,
+        keys: tuple[str, ...],
+        columns: tuple[str, ...],
+    ) -> Optional["Insert"]:
+        dialect = self.engine.dialect.name
+        if on_conflict_insert := ON_CONFLICT_INSERTS.get(dialect):
+            on_conflict_statement = on_conflict_insert(table)
+            return cast(
+                "Insert",
+                on_conflict_statement.on_conflict_do_update(
+                    index_elements=keys,
+                    set_={column: on_conflict_statement.excluded[column] for column in columns},
+                ),
+            )
+        if dialect in ON_DUPLICATE_KEY_DIALECTS:
+            on_duplicate_key_statement = mysql_insert(table)
+            return on_duplicate_key_statement.on_duplicate_key_update(
+                {column: on_duplicate_key_statement.inserted[column] for column in columns},
+            )
+        return None
+
+    def _dump_data(self, record: StorageRecord) -> Union[str, dict[str, Any]]:
+        if self.native_json:
+            return record.model_dump(
+                mode="json",
+                exclude_defaults=True,
+                exclude={"chats": {"registry"}},
+            )
+        return record.model_dump_json(exclude_defaults=True, exclude={"chats": {"registry"}})
+
+    def _load_data(self, model: type[ModelT], data: Union[str, dict[str, Any]]) -> ModelT:
+        if isinstance(data, str):
+            return model.model_validate_json(json_data=data)
+        return model.model_validate(obj=data)
+
+    async def _migrate_record(self, mailer_id: int) -> StorageRecord:
+        statement = select(self.table.c.data).where(self.table.c.id == mailer_id).with_for_update()
+        async with self.session_maker() as session:
+            result = await session.execute(statement=statement)
+            data = result.scalar_one()
+            record = self._load_data(model=StorageRecord, data=data)
+            await self._load_chats(records={mailer_id: record})
+            if self._is_legacy(data=data):  # Not yet migrated by another process.
+                await session.execute(
+                    statement=update(self.table)
+                    .where(self.table.c.id == mailer_id)
+                    .values(data=self._dump_data(record=record)),
+                )
+                await session.execute(
+                    statement=delete(self.chats_table).where(
+                        self.chats_table.c.mailer_id == mailer_id,
+                    ),
+                )
+                for state, chats in record.chats.registry.items():
+                    await self._insert_chats(
+                        session=session,
+                        mailer_id=mailer_id,
+                        state=state,
+                        chats=chats,
+                    )
+            await session.commit()
+        return record
+
+    def _is_legacy(self, data: Union[str, dict[str, Any]]) -> bool:
+        mapping = loads(data) if isinstance(data, str) else data
+        return LEGACY_CHATS_MARKER in mapping.get("chats", {})
+
+    async def _insert_chats(
+        self,
+        session: AsyncSession,
+        mailer_id: int,
+        state: ChatState,
+        chats: Iterable[int],
+    ) -> None:
+        rows = [{"mailer_id": mailer_id, "chat_id": chat_id, "state": state} for chat_id in chats]
+        for batch in batched(sequence=rows, size=CHATS_BATCH_SIZE):
+            await session.execute(insert(self.chats_table), batch)
+
+    async def _load_chats(self, records: dict[int, StorageRecord]) -> None:
+        statement = select(
+            self.chats_table.c.mailer_id,
+            self.chats_table.c.chat_id,
+            self.chats_table.c.state,
+        ).where(self.chats_table.c.mailer_id.in_(records))
+        async with self.session_maker() as session:
+            result = await session.execute(statement=statement)
+        states: defaultdict[tuple[int, ChatState], list[int]] = defaultdict(list)
+        for mailer_id, chat_id, state in result.all():
+            states[mailer_id, ChatState(state)].append(chat_id)
+        for (mailer_id, state), chats in states.items():
+            records[mailer_id].chats.mark(state=state, chats=chats)
+
+    async def _count_chats(self, stubs: dict[int, StorageStub]) -> None:
+        statement = (
+            select(self.chats_table.c.mailer_id, self.chats_table.c.state, func.count())
+            .where(self.chats_table.c.mailer_id.in_(stubs))
+            .group_by(self.chats_table.c.mailer_id, self.chats_table.c.state)
+        )
+        async with self.session_maker() as session:
+            result = await session.execute(statement=statement)
+        for stub in stubs.values():
+            stub.counters = dict.fromkeys(ChatState, 0)
+        for mailer_id, state, count in result.all():
+            stubs[mailer_id].counters[ChatState(state)] = count
@@ -0,0 +1,15 @@
+from collections.abc import Generator, Sequence
+from typing import TypeVar
+
+
+ItemType = TypeVar("ItemType")
+
+
+def batched(
+    sequence: Sequence[ItemType],
+    size: int,
+) -> Generator[Sequence[ItemType], None, None]:
+    if size < 1:
+        raise ValueError("Size must be at least one.")
+    for index in range(0, len(sequence), size):
+        yield sequence[index : index + size]
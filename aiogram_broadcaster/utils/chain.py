@@ -27,6 +27,8 @@ class Chain(Generic[ChainType]):
         self.name = hex(id(self)) if name is None else name
         self.head: Optional[ChainType] = None
         self.tail: list[ChainType] = []
+        self.chain_version = 0
+        self._chain_snapshot: Optional[tuple[int, tuple[ChainType, ...]]] = None
 
     def __repr__(self) -> str:
         return f"{type(self).__name__}(name='{self.name}')"
@@ -44,6 +46,16 @@ class Chain(Generic[ChainType]):
         for chain in self.tail:
             yield from chain.chain_tail
 
+    @property
+    def chain_snapshot(self: ChainType) -> tuple[ChainType, ...]:
+        if self._chain_snapshot is None or self._chain_snapshot[0] != self.chain_version:
+            self._chain_snapshot = (self.chain_version, tuple(self.chain_tail))
+        return self._chain_snapshot[1]
+
+    def invalidate_chain(self) -> None:
+        for chain in self.chain_head:
+            chain.chain_version += 1
+
     def bind(self, *chains: ChainType) -> Self:
         if not chains:
             raise ValueError(f"At least one {self.__chain_sub_name__} must be provided to bind.")
@@ -62,4 +74,5 @@ class Chain(Generic[ChainType]):
                 )
             chain.head = self
             self.tail.append(chain)
+            self.invalidate_chain()
         return self
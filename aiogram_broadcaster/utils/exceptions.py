@@ -49,3 +49,13 @@ class MailerExtendError(MailerError):
 
 class MailerResetError(MailerError):
     message = "Mailer id {mailer_id} cannot be reset."
+
+
+class MailerHydrateError(MailerError):
+    message = "Mailer id {mailer_id} is not hydrated, call 'Mailer.hydrate' first."
+
+
+class MailerChatsError(MailerError):
+    message = (
+        "Mailer id {mailer_id} keeps its chats in the storage, use 'Mailer.counters' instead."
+    )
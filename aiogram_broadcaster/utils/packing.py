@@ -0,0 +1,28 @@
+from array import array
+from base64 import b64decode, b64encode
+from collections.abc import Iterable
+from itertools import accumulate
+from operator import sub
+from sys import byteorder
+from zlib import compress, decompress
+
+
+PACKED_BYTEORDER = "little"
+PACKED_COMPRESSION_LEVEL = 1
+
+
+def pack_ids(ids: Iterable[int]) -> str:
+    values = array("q", sorted(ids))
+    deltas = array("q", values[:1])
+    deltas.extend(map(sub, values[1:], values[:-1]))
+    if byteorder != PACKED_BYTEORDER:
+        deltas.byteswap()
+    return b64encode(compress(deltas.tobytes(), level=PACKED_COMPRESSION_LEVEL)).decode()
+
+
+def unpack_ids(data: str) -> "array[int]":
+    deltas = array("q")
+    deltas.frombytes(decompress(b64decode(data)))
+    if byteorder != PACKED_BYTEORDER:
+        deltas.byteswap()
+    return array("q", accumulate(deltas))
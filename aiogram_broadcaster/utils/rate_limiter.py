@@ -0,0 +1,114 @@
+from asyncio import sleep
+from dataclasses import dataclass
+from time import monotonic
+from typing import Optional
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    amount: int
+    period: float
+
+    def __post_init__(self) -> None:
+        if self.amount < 1:
+            raise ValueError("Amount must be at least one.")
+        if self.period <= 0:
+            raise ValueError("Period must be positive.")
+
+    @property
+    def rate(self) -> float:
+        return self.amount / self.period
+
+
+DEFAULT_GLOBAL_LIMIT = RateLimit(amount=30, period=1)
+DEFAULT_CHAT_LIMIT = RateLimit(amount=1, period=1)
+DEFAULT_GROUP_LIMIT = RateLimit(amount=20, period=60)
+DEFAULT_PRUNE_THRESHOLD = 10_000
+
+
+class TokenBucket:
+    def __init__(self, limit: RateLimit) -> None:
+        self.limit = limit
+        self.tokens = float(limit.amount)
+        self.updated_at = monotonic()
+
+    def refill(self, now: float) -> None:
+        tokens = self.tokens + (now - self.updated_at) * self.limit.rate
+        self.tokens = min(float(self.limit.amount), tokens)
+        self.updated_at = now
+
+    def is_full(self, now: float) -> bool:
+        self.refill(now=now)
+        return self.tokens >= self.limit.amount
+
+    def reserve(self) -> float:
+        self.refill(now=monotonic())
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.limit.rate
+
+    def suspend(self, delay: float) -> None:
+        self.refill(now=monotonic())
+        self.tokens = min(self.tokens, 0) - delay * self.limit.rate
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay:
+            await sleep(delay)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        global_limit: Optional[RateLimit] = DEFAULT_GLOBAL_LIMIT,
+        chat_limit: Optional[RateLimit] = DEFAULT_CHAT_LIMIT,
+        group_limit: Optional[RateLimit] = DEFAULT_GROUP_LIMIT,
+        prune_threshold: int = DEFAULT_PRUNE_THRESHOLD,
+    ) -> None:
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit
+        self.group_limit = group_limit
+        self.prune_threshold = prune_threshold
+
+        self._global_buckets: dict[int, TokenBucket] = {}
+        self._chat_buckets: dict[tuple[int, int], TokenBucket] = {}
+        self._next_prune = prune_threshold
+
+    async def acquire(self, bot_id: int, chat_id: int) -> None:
+        if chat_bucket := self.get_chat_bucket(bot_id=bot_id, chat_id=chat_id):
+            await chat_bucket.acquire()
+        if global_bucket := self.get_global_bucket(bot_id=bot_id):
+            await global_bucket.acquire()
+
+    async def suspend(self, bot_id: int, delay: float) -> None:
+        if global_bucket := self.get_global_bucket(bot_id=bot_id):
+            global_bucket.suspend(delay=delay)
+
+    def get_global_bucket(self, bot_id: int) -> Optional[TokenBucket]:
+        if not self.global_limit:
+            return None
+        if bot_id not in self._global_buckets:
+            self._global_buckets[bot_id] = TokenBucket(limit=self.global_limit)
+        return self._global_buckets[bot_id]
+
+    def get_chat_bucket(self, bot_id: int, chat_id: int) -> Optional[TokenBucket]:
+        limit = self.group_limit if chat_id < 0 else self.chat_limit
+        if not limit:
+            return None
+        key = (bot_id, chat_id)
+        if key not in self._chat_buckets:
+            self._prune_chat_buckets()
+            self._chat_buckets[key] = TokenBucket(limit=limit)
+        return self._chat_buckets[key]
+
+    def _prune_chat_buckets(self) -> None:
+        if len(self._chat_buckets) < self._next_prune:
+            return
+        now = monotonic()
+        self._chat_buckets = {
+            key: bucket
+            for key, bucket in self._chat_buckets.items()
+            if not bucket.is_full(now=now)
+        }
+        self._next_prune = max(self.prune_threshold, len(self._chat_buckets) * 2)
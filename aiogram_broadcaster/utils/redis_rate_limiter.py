@@ -0,0 +1,89 @@
+from asyncio import sleep
+from typing import Optional
+
+from .exceptions import DependencyNotFoundError
+from .rate_limiter import (
+    DEFAULT_CHAT_LIMIT,
+    DEFAULT_GLOBAL_LIMIT,
+    DEFAULT_GROUP_LIMIT,
+    DEFAULT_PRUNE_THRESHOLD,
+    RateLimit,
+    RateLimiter,
+)
+
+
+try:
+    from redis.asyncio import Redis
+except ImportError as error:
+    raise DependencyNotFoundError(
+        feature_name="RedisRateLimiter",
+        module_name="redis",
+        extra_name="redis",
+    ) from error
+
+
+DEFAULT_KEY_PREFIX = "rate_limit"
+DEFAULT_KEY_SEPERATOR = ":"
+RESERVE_SCRIPT = """
+local time = redis.call("TIME")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local delay = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call("GET", KEYS[1]) or now), now)
+local wait = 0
+if delay > 0 then
+    tat = math.max(tat, now + tolerance) + delay
+else
+    wait = math.max(0, tat - tolerance - now)
+    tat = tat + emission
+end
+redis.call("SET", KEYS[1], tat, "PX", math.ceil(tat - now) + 1)
+return wait
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    def __init__(
+        self,
+        redis: Redis,
+        global_limit: Optional[RateLimit] = DEFAULT_GLOBAL_LIMIT,
+        chat_limit: Optional[RateLimit] = DEFAULT_CHAT_LIMIT,
+        group_limit: Optional[RateLimit] = DEFAULT_GROUP_LIMIT,
+        prune_threshold: int = DEFAULT_PRUNE_THRESHOLD,
+        key_prefix: str = DEFAULT_KEY_PREFIX,
+        key_seperator: str = DEFAULT_KEY_SEPERATOR,
+    ) -> None:
+        super().__init__(
+            global_limit=global_limit,
+            chat_limit=chat_limit,
+            group_limit=group_limit,
+            prune_threshold=prune_threshold,
+        )
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.key_seperator = key_seperator
+        self._reserve_script = redis.register_script(RESERVE_SCRIPT)
+
+    async def acquire(self, bot_id: int, chat_id: int) -> None:
+        if chat_bucket := self.get_chat_bucket(bot_id=bot_id, chat_id=chat_id):
+            await chat_bucket.acquire()
+        if self.global_limit:
+            delay = await self._reserve(bot_id=bot_id, limit=self.global_limit)
+            if delay:
+                await sleep(delay)
+
+    async def suspend(self, bot_id: int, delay: float) -> None:
+        if self.global_limit:
+            await self._reserve(bot_id=bot_id, limit=self.global_limit, delay=delay)
+
+    def build_key(self, bot_id: int) -> str:
+        return self.key_seperator.join((self.key_prefix, str(bot_id)))
+
+    async def _reserve(self, bot_id: int, limit: RateLimit, delay: float = 0) -> float:
+        emission = limit.period * 1000 / limit.amount
+        wait = await self._reserve_script(
+            keys=[self.build_key(bot_id=bot_id)],
+            args=[emission, (limit.amount - 1) * emission, delay * 1000],
+        )
+        return int(wait) / 1000
@@ -0,0 +1,48 @@
+import logging
+import sys
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from redis.asyncio import Redis
+
+from aiogram_broadcaster import Broadcaster
+from aiogram_broadcaster.contents import MessageSendContent
+from aiogram_broadcaster.storages.redis import RedisStorage
+from aiogram_broadcaster.utils.redis_rate_limiter import RedisRateLimiter
+
+
+TOKEN = "123:Abc"
+CHATS = {230912392, 122398104, 39431920120}
+
+
+router = Router(name=__name__)
+
+
+@router.message()
+async def process_any_message(message: Message, broadcaster: Broadcaster) -> None:
+    content = MessageSendContent(message=message)
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=content)
+    mailer.start()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+
+    bot = Bot(token=TOKEN)
+    dispatcher = Dispatcher()
+    dispatcher.include_router(router)
+
+    # Run this script in several processes: each of them restores the stored mailers
+    # and claims pending chats in batches, while the global rate budget is shared.
+    redis = Redis()
+    storage = RedisStorage(redis=redis, chat_queue=True, claim_timeout=60)
+    rate_limiter = RedisRateLimiter(redis=redis)
+
+    broadcaster = Broadcaster(bot, storage=storage, rate_limiter=rate_limiter)
+    broadcaster.setup(dispatcher=dispatcher)
+
+    dispatcher.run_polling(bot)
+
+
+if __name__ == "__main__":
+    main()
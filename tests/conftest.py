@@ -0,0 +1,94 @@
+# ruff: noqa: PLC0415
+
+from asyncio import sleep
+from collections.abc import AsyncGenerator, Awaitable, Callable, Iterable
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import TelegramMethod
+
+from aiogram_broadcaster.storages.base import BaseStorage
+
+
+StorageFactory = Callable[..., Awaitable[BaseStorage]]
+
+
+class FakeSession(BaseSession):
+    def __init__(self, delay: float = 0, fail: Iterable[int] = ()) -> None:
+        super().__init__()
+        self.delay = delay
+        self.fail = set(fail)
+        self.sent: list[int] = []
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(
+        self,
+        bot: Bot,  # noqa: ARG002
+        method: TelegramMethod[Any],
+        timeout: Optional[int] = None,  # noqa: ARG002
+    ) -> Any:
+        await sleep(self.delay)
+        chat_id = getattr(method, "chat_id", 0)
+        if chat_id in self.fail:
+            raise TelegramBadRequest(method=method, message="Bad Request")
+        self.sent.append(chat_id)
+
+    async def stream_content(
+        self,
+        *args: Any,  # noqa: ARG002
+        **kwargs: Any,  # noqa: ARG002
+    ) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+
+def create_bot(delay: float = 0, fail: Iterable[int] = ()) -> Bot:
+    session = FakeSession(delay=delay, fail=fail)
+    return Bot(token="42:TEST", session=session)  # noqa: S106
+
+
+def sent_chats(bot: Bot) -> list[int]:
+    session = bot.session
+    assert isinstance(session, FakeSession)
+    return session.sent
+
+
+@pytest.fixture(params=["redis", "sqlalchemy"])
+async def storage_factory(
+    request: pytest.FixtureRequest,
+    tmp_path: Path,
+) -> AsyncGenerator[StorageFactory, None]:
+    storages: list[BaseStorage] = []
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        from aiogram_broadcaster.storages.redis import RedisStorage
+
+        server = fakeredis.FakeServer()
+
+        def build(**kwargs: Any) -> BaseStorage:
+            return RedisStorage(redis=fakeredis.FakeAsyncRedis(server=server), **kwargs)
+
+    else:
+        pytest.importorskip("aiosqlite")
+        from aiogram_broadcaster.storages.sqlalchemy import SQLAlchemyStorage
+
+        url = f"sqlite+aiosqlite:///{tmp_path / 'mailers.db'}"
+
+        def build(**kwargs: Any) -> BaseStorage:
+            return SQLAlchemyStorage.from_url(url=url, **kwargs)
+
+    async def create_storage(**kwargs: Any) -> BaseStorage:
+        storage = build(**kwargs)
+        await storage.startup()
+        storages.append(storage)
+        return storage
+
+    yield create_storage
+    for storage in storages:
+        await storage.shutdown()
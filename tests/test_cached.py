@@ -0,0 +1,12 @@
+import pytest
+
+from aiogram_broadcaster.storages.cached import CachedStorage
+
+from .conftest import StorageFactory
+
+
+async def test_cached_storage_rejects_chat_queue(storage_factory: StorageFactory) -> None:
+    storage = await storage_factory(chat_queue=True)
+
+    with pytest.raises(ValueError, match="chat queue"):
+        CachedStorage(storage=storage)
@@ -0,0 +1,93 @@
+from asyncio import create_task, gather, sleep
+
+from aiogram_broadcaster import Broadcaster
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.mailer.chats import ChatState
+from aiogram_broadcaster.mailer.status import MailerStatus
+
+from .conftest import StorageFactory, create_bot, sent_chats
+
+
+CHATS = range(1, 101)
+
+
+async def test_two_broadcasters_send_each_chat_once(storage_factory: StorageFactory) -> None:
+    first_storage = await storage_factory(chat_queue=True, claim_batch_size=5)
+    second_storage = await storage_factory(chat_queue=True, claim_batch_size=5)
+    first_bot, second_bot = create_bot(delay=0.001), create_bot(delay=0.001)
+    first = Broadcaster(first_bot, storage=first_storage)
+    second = Broadcaster(second_bot, storage=second_storage)
+    mailer = await first.create_mailer(
+        chats=CHATS,
+        content=TextContent(text="hello"),
+        concurrency=2,
+    )
+    await second.restore_mailers()
+
+    await gather(mailer.start(), second[mailer.id].start())
+
+    sent = sent_chats(first_bot) + sent_chats(second_bot)
+    assert sorted(sent) == list(CHATS)
+    assert sent_chats(first_bot)
+    assert sent_chats(second_bot)
+    assert mailer.status is MailerStatus.COMPLETED
+    assert await first_storage.count_chats(mailer_id=mailer.id) == {
+        ChatState.PENDING: 0,
+        ChatState.FAILED: 0,
+        ChatState.SUCCESS: len(CHATS),
+    }
+
+
+async def test_expired_claims_are_reclaimed(storage_factory: StorageFactory) -> None:
+    storage = await storage_factory(chat_queue=True, claim_timeout=0.2)
+    crashed = Broadcaster(create_bot(), storage=storage)
+    mailer = await crashed.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+    claimed = await storage.claim_chats(mailer_id=mailer.id, count=10)  # The owner dies here.
+    assert len(claimed) == 10
+
+    await sleep(0.3)
+    bot = create_bot()
+    survivor = Broadcaster(bot, storage=await storage_factory(chat_queue=True, claim_timeout=0.2))
+    await survivor.restore_mailers()
+    await survivor[mailer.id].start()
+
+    assert sorted(sent_chats(bot)) == list(CHATS)
+    assert survivor[mailer.id].status is MailerStatus.COMPLETED
+
+
+async def test_run_waits_for_claims_of_crashed_owner(storage_factory: StorageFactory) -> None:
+    storage = await storage_factory(chat_queue=True, claim_timeout=0.3)
+    broadcaster = Broadcaster(create_bot(), storage=storage)
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+    claimed = await storage.claim_chats(mailer_id=mailer.id, count=10)  # The owner dies here.
+
+    bot = create_bot()
+    survivor = Broadcaster(bot, storage=await storage_factory(chat_queue=True, claim_timeout=0.3))
+    await survivor.restore_mailers()
+    assert await survivor[mailer.id].start()
+
+    assert sorted(sent_chats(bot)) == list(CHATS)
+    assert set(claimed) <= set(sent_chats(bot))
+    assert survivor[mailer.id].status is MailerStatus.COMPLETED
+    assert survivor[mailer.id].counters[ChatState.PENDING] == 0
+
+
+async def test_run_waits_for_claims_of_live_owner(storage_factory: StorageFactory) -> None:
+    storage = await storage_factory(chat_queue=True, claim_timeout=5)
+    broadcaster = Broadcaster(create_bot(), storage=storage)
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+    claimed = await storage.claim_chats(mailer_id=mailer.id, count=10)
+
+    async def finish_claimed() -> None:
+        await sleep(0.2)
+        await storage.mark_chats(mailer_id=mailer.id, state=ChatState.SUCCESS, chats=claimed)
+
+    task = create_task(finish_claimed())
+    bot = create_bot()
+    other = Broadcaster(bot, storage=await storage_factory(chat_queue=True, claim_timeout=5))
+    await other.restore_mailers()
+    assert await other[mailer.id].start()
+    await task
+
+    assert sorted(sent_chats(bot) + claimed) == list(CHATS)
+    assert other[mailer.id].status is MailerStatus.COMPLETED
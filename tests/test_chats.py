@@ -0,0 +1,17 @@
+from aiogram_broadcaster.mailer.chats import Chats, ChatsMetric, ChatState
+
+
+def test_metric_can_be_built_from_ids() -> None:
+    metric = ChatsMetric(ids={1, 2, 3})
+    assert len(metric) == 3
+    assert 2 in metric
+    assert sorted(metric) == [1, 2, 3]
+
+
+def test_metric_iterates_over_snapshot() -> None:
+    chats = Chats.from_iterable(range(10))
+    pending = chats.pending
+    for chat in pending:
+        chats.mark(ChatState.SUCCESS, [chat])
+    assert not chats.pending
+    assert len(chats.success) == 10
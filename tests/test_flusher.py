@@ -0,0 +1,37 @@
+from asyncio import Event, Lock, create_task
+from typing import TYPE_CHECKING, cast
+
+from aiogram_broadcaster.mailer.chats import ChatState
+from aiogram_broadcaster.mailer.flusher import FlushPolicy, StateFlusher
+
+
+if TYPE_CHECKING:
+    from aiogram_broadcaster.storages.base import BaseStorage
+
+
+class BlockingStorage:
+    def __init__(self) -> None:
+        self.started = Event()
+        self.released = Event()
+        self.written: list[int] = []
+
+    async def mark_chats(self, mailer_id: int, state: ChatState, chats: list[int]) -> None:  # noqa: ARG002
+        self.started.set()
+        await self.released.wait()
+        self.written.append(mailer_id)
+
+
+async def test_flush_skips_mailers_discarded_mid_flush() -> None:
+    storage = BlockingStorage()
+    flusher = StateFlusher(storage=cast("BaseStorage", storage), policy=FlushPolicy())
+    flusher._pending = {1: {10: ChatState.SUCCESS}, 2: {20: ChatState.FAILED}}
+    flusher._locks = {1: Lock(), 2: Lock()}
+
+    task = create_task(flusher.flush())
+    await storage.started.wait()
+    flusher.discard(mailer_id=2)
+    storage.released.set()
+    await task
+
+    assert storage.written == [1]
+    assert flusher.size == 0
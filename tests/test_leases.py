@@ -0,0 +1,157 @@
+from asyncio import gather, sleep
+from pathlib import Path
+
+import pytest
+
+from aiogram_broadcaster import Broadcaster
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.mailer.chats import Chats
+from aiogram_broadcaster.mailer.status import MailerStatus
+from aiogram_broadcaster.storages.base import BaseStorage
+from aiogram_broadcaster.storages.cached import CachedStorage
+from aiogram_broadcaster.utils.exceptions import MailerStartError
+
+from .conftest import StorageFactory, create_bot, sent_chats
+
+
+CHATS = range(1, 51)
+
+
+@pytest.mark.parametrize("cached", [False, True])
+async def test_leased_mailer_runs_on_one_broadcaster(
+    storage_factory: StorageFactory,
+    *,
+    cached: bool,
+) -> None:
+    def wrap(storage: BaseStorage) -> BaseStorage:
+        return CachedStorage(storage=storage) if cached else storage
+
+    first_bot, second_bot = create_bot(delay=0.001), create_bot(delay=0.001)
+    first = Broadcaster(first_bot, storage=wrap(await storage_factory()), lease_timeout=1)
+    second = Broadcaster(second_bot, storage=wrap(await storage_factory()), lease_timeout=1)
+    mailer = await first.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+    await second.restore_mailers()
+
+    started = await gather(mailer.start(), second[mailer.id].start())
+
+    assert sorted(started) == [False, True]
+    assert sorted(sent_chats(first_bot) + sent_chats(second_bot)) == list(CHATS)
+
+
+async def test_cached_storage_reloads_chat_states(storage_factory: StorageFactory) -> None:
+    storage = await storage_factory()
+    cached = CachedStorage(storage=await storage_factory())
+    broadcaster = Broadcaster(create_bot(), storage=storage)
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+    assert len((await cached.get_record(mailer_id=mailer.id)).chats.pending) == len(CHATS)
+
+    await mailer.start()
+
+    chats = await cached.get_chat_states(mailer_id=mailer.id)
+    assert not chats.pending
+    assert not (await cached.get_record(mailer_id=mailer.id)).chats.pending
+
+
+async def test_concurrent_start_with_lease_runs_once(storage_factory: StorageFactory) -> None:
+    bot = create_bot(delay=0.001)
+    broadcaster = Broadcaster(bot, storage=await storage_factory(), lease_timeout=1)
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+
+    results = await gather(mailer.start(), mailer.start(), return_exceptions=True)
+
+    assert results.count(True) == 1
+    assert any(isinstance(result, MailerStartError) for result in results)
+    assert sorted(sent_chats(bot)) == list(CHATS)
+
+
+async def test_start_can_be_retried_after_lease_is_refused(
+    storage_factory: StorageFactory,
+) -> None:
+    storage = await storage_factory()
+    bot = create_bot()
+    broadcaster = Broadcaster(bot, storage=storage, lease_timeout=1)
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+    assert await storage.acquire_lease(mailer_id=mailer.id, owner_id=0, timeout=1)
+
+    assert not await mailer.start()
+    assert mailer.can_started
+
+    await storage.release_lease(mailer_id=mailer.id, owner_id=0)
+    assert await mailer.start()
+    assert sorted(sent_chats(bot)) == list(CHATS)
+
+
+async def test_sqlalchemy_leases_work_with_existing_mailers_table(tmp_path: Path) -> None:
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import text  # noqa: PLC0415
+
+    from aiogram_broadcaster.storages.sqlalchemy import SQLAlchemyStorage  # noqa: PLC0415
+
+    storage = SQLAlchemyStorage.from_url(url=f"sqlite+aiosqlite:///{tmp_path / 'mailers.db'}")
+    legacy_table = (
+        "CREATE TABLE aiogram_broadcaster (id BIGINT PRIMARY KEY, data VARCHAR NOT NULL)"
+    )
+    async with storage.engine.begin() as connection:  # Created before leases existed.
+        await connection.execute(text(legacy_table))
+    await storage.startup()
+    try:
+        assert await storage.acquire_lease(mailer_id=1, owner_id=1, timeout=1)
+        assert not await storage.acquire_lease(mailer_id=1, owner_id=2, timeout=1)
+        await storage.release_lease(mailer_id=1, owner_id=1)
+        assert await storage.acquire_lease(mailer_id=1, owner_id=2, timeout=1)
+    finally:
+        await storage.shutdown()
+
+
+async def test_failed_refresh_releases_lease(
+    storage_factory: StorageFactory,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = await storage_factory()
+    broadcaster = Broadcaster(create_bot(), storage=storage, lease_timeout=1)
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+
+    async def get_chat_states(mailer_id: int) -> Chats:  # noqa: ARG001, RUF029
+        raise ConnectionError
+
+    monkeypatch.setattr(storage, "get_chat_states", get_chat_states)
+    with pytest.raises(ConnectionError):
+        await mailer.start()
+
+    assert mailer.awaiting_lease
+    assert mailer.can_started
+    assert await storage.acquire_lease(mailer_id=mailer.id, owner_id=0, timeout=1)
+
+
+async def test_failover_logs_failed_starts_and_keeps_retrying(
+    storage_factory: StorageFactory,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    storage = await storage_factory()
+    bot = create_bot()
+    broadcaster = Broadcaster(bot, storage=storage, lease_timeout=0.1)
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+    get_chat_states = storage.get_chat_states
+    failures = 3
+
+    async def flaky_get_chat_states(mailer_id: int) -> Chats:
+        nonlocal failures
+        if failures:
+            failures -= 1
+            raise ConnectionError
+        return await get_chat_states(mailer_id=mailer_id)
+
+    monkeypatch.setattr(storage, "get_chat_states", flaky_get_chat_states)
+    with pytest.raises(ConnectionError):
+        await mailer.start()
+    await broadcaster.run_mailers()
+    for _ in range(50):
+        if mailer.status is MailerStatus.COMPLETED:
+            break
+        await sleep(0.05)
+    await broadcaster.shutdown()
+
+    assert mailer.status is MailerStatus.COMPLETED
+    assert sorted(sent_chats(bot)) == list(CHATS)
+    assert caplog.messages.count(f"Failed to start mailer id={mailer.id}.") == 2
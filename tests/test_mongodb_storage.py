@@ -0,0 +1,42 @@
+import pytest
+
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.mailer.chats import Chats, ChatState
+from aiogram_broadcaster.storages.base import StorageRecord
+
+
+pytest.importorskip("mongomock_motor")
+from mongomock_motor import AsyncMongoMockClient
+
+from aiogram_broadcaster.storages.mongodb import MongoDBStorage
+
+
+MAILER_ID = 1
+
+
+def create_record(chats: list[int]) -> StorageRecord:
+    return StorageRecord(
+        chats=Chats.from_iterable(chats),
+        content=TextContent(text="hello"),
+        bot_id=42,
+    )
+
+
+async def test_set_record_replaces_chats(monkeypatch: pytest.MonkeyPatch) -> None:
+    storage = MongoDBStorage(client=AsyncMongoMockClient())
+    await storage.startup()
+    await storage.set_record(mailer_id=MAILER_ID, record=create_record([1, 2, 3]))
+    await storage.set_record(mailer_id=MAILER_ID, record=create_record([3, 4]))
+
+    record = await storage.get_record(mailer_id=MAILER_ID)
+    assert record.chats.registry[ChatState.PENDING] == {3, 4}
+
+    async def fail(**kwargs: object) -> None:  # noqa: ARG001, RUF029
+        raise ConnectionError
+
+    monkeypatch.setattr(storage.chats_collection, "delete_many", fail)
+    with pytest.raises(ConnectionError):
+        await storage.set_record(mailer_id=MAILER_ID, record=create_record([5]))
+
+    record = await storage.get_record(mailer_id=MAILER_ID)
+    assert record.chats.registry[ChatState.PENDING] >= {5}
@@ -0,0 +1,93 @@
+from itertools import count
+from string import Template
+
+import pytest
+
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.placeholder.items.regexp import (
+    RegexMode,
+    RegexpPlaceholderEngine,
+    RegexpPlaceholderItem,
+)
+from aiogram_broadcaster.placeholder.manager import PlaceholderManager
+
+
+async def test_resolve_calls_mailer_placeholders_lazily_once() -> None:
+    calls: list[str] = []
+    placeholder = PlaceholderManager()
+
+    @placeholder.string("name", per_chat=False)
+    def get_name() -> str:
+        calls.append("name")
+        return "World"
+
+    @placeholder.string("unused", per_chat=False)
+    def get_unused() -> str:
+        calls.append("unused")
+        return "unused"
+
+    items = await placeholder.resolve()
+    assert calls == []
+
+    content = TextContent(text="Hello, $name!")
+    for chat_id in range(3):
+        rendered = await placeholder.render(content, items, chat_id=chat_id)
+        assert rendered.text == "Hello, World!"
+    assert calls == ["name"]
+
+    await placeholder.render(content, await placeholder.resolve(), chat_id=0)
+    assert calls == ["name", "name"]
+
+
+async def test_render_time_parameters_make_placeholders_per_chat() -> None:
+    placeholder = PlaceholderManager()
+
+    @placeholder.string("source")
+    def get_source(template: Template) -> str:
+        return template.template
+
+    items = await placeholder.resolve()
+    for text in ("$source", "Source: $source"):
+        rendered = await placeholder.render(TextContent(text=text), items, chat_id=1)
+        assert rendered.text == text.replace("$source", text)
+
+
+async def test_callbacks_are_evaluated_per_chat_by_default() -> None:
+    counter = count()
+    placeholder = PlaceholderManager()
+
+    @placeholder.string("number")
+    def get_number() -> int:
+        return next(counter)
+
+    items = await placeholder.resolve()
+    content = TextContent(text="$number")
+    rendered = [await placeholder.render(content, items, chat_id=chat_id) for chat_id in range(3)]
+    assert [model.text for model in rendered] == ["0", "1", "2"]
+
+
+def test_per_run_placeholders_reject_per_chat_parameters() -> None:
+    placeholder = PlaceholderManager()
+    with pytest.raises(ValueError, match="per-chat parameters"):
+        placeholder.string.register(lambda chat_id: chat_id, "chat", per_chat=False)
+
+
+REGEXP_CASES = [
+    ("abc", []),
+    ("Hello, {name}!", [(r"\{name\}", "World", RegexMode.SEARCH)]),
+    ("a1 b2 c3", [(r"\d", "#", RegexMode.FINDALL), (r"[a-z]", "_", RegexMode.SEARCH)]),
+    ("x-y", [(r"(\w)-(\w)", r"\2-\1", RegexMode.MATCH)]),
+]
+
+
+@pytest.mark.parametrize(("source", "specs"), REGEXP_CASES)
+async def test_regexp_scan_matches_sequential_render(
+    source: str,
+    specs: list[tuple[str, str, RegexMode]],
+) -> None:
+    engine = RegexpPlaceholderEngine()
+    items = [RegexpPlaceholderItem(value, pattern, mode=mode) for pattern, value, mode in specs]
+
+    rendered = await engine.render(source, *items)
+
+    assert rendered == await engine.render_sequentially(source, *items)
@@ -0,0 +1,37 @@
+import pytest
+
+from aiogram_broadcaster import Broadcaster
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.mailer.chats import CompactChatSet
+
+from .conftest import create_bot, sent_chats
+
+
+def test_compact_chat_set_peek_follows_pop_order() -> None:
+    chats = CompactChatSet(range(10))
+    chats.discard(8)
+    chats.add(42)
+    peeked = chats.peek(count=4)
+    assert peeked == [chats.pop() for _ in range(4)]
+
+
+@pytest.mark.parametrize("compact_chats", [False, True])
+async def test_prefetch_window_matches_send_order(compact_chats: bool) -> None:
+    batches: list[list[int]] = []
+    bot = create_bot()
+    broadcaster = Broadcaster(bot)
+
+    @broadcaster.placeholder.string("name", batch_size=10)
+    def get_names(chat_ids: list[int]) -> dict[int, str]:
+        batches.append(chat_ids)
+        return {chat_id: str(chat_id) for chat_id in chat_ids}
+
+    mailer = await broadcaster.create_mailer(
+        chats=range(100),
+        content=TextContent(text="Hello, $name!"),
+        compact_chats=compact_chats,
+    )
+    assert await mailer.start()
+
+    assert sorted(sent_chats(bot)) == list(range(100))
+    assert len(batches) == 10
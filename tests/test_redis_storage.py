@@ -0,0 +1,98 @@
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from aiogram_broadcaster import Broadcaster
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.mailer.chats import Chats, ChatState
+from aiogram_broadcaster.mailer.status import MailerStatus
+from aiogram_broadcaster.storages.base import StorageRecord
+
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+from redis.exceptions import WatchError  # noqa: E402
+
+from aiogram_broadcaster.storages.redis import RedisStorage  # noqa: E402
+
+from .conftest import create_bot, sent_chats  # noqa: E402
+
+
+MAILER_ID = 1
+
+
+@pytest.fixture
+async def storage() -> AsyncGenerator[RedisStorage, None]:
+    storage = RedisStorage(redis=fakeredis.FakeAsyncRedis())
+    await storage.startup()
+    record = StorageRecord(
+        chats=Chats.from_iterable(range(10)),
+        content=TextContent(text="hello"),
+        bot_id=42,
+    )
+    await storage.set_record(mailer_id=MAILER_ID, record=record)
+    yield storage
+    await storage.shutdown()
+
+
+async def test_update_record_replays_changes_after_conflict(storage: RedisStorage) -> None:
+    async with storage.update_record(mailer_id=MAILER_ID) as record:
+        record.chats.mark(state=ChatState.SUCCESS, chats=[1, 2])
+        record.concurrency = 2
+        await storage.mark_chats(mailer_id=MAILER_ID, state=ChatState.FAILED, chats=[3])
+
+    record = await storage.get_record(mailer_id=MAILER_ID)
+    assert record.chats.registry[ChatState.SUCCESS] == {1, 2}
+    assert record.chats.registry[ChatState.FAILED] == {3}
+    assert record.concurrency == 2
+
+
+async def test_update_record_skips_write_when_block_raises(storage: RedisStorage) -> None:
+    with pytest.raises(RuntimeError):
+        async with storage.update_record(mailer_id=MAILER_ID) as record:
+            record.chats.mark(state=ChatState.SUCCESS, chats=[1])
+            raise RuntimeError
+
+    record = await storage.get_record(mailer_id=MAILER_ID)
+    assert not record.chats.registry[ChatState.SUCCESS]
+
+
+async def test_update_record_gives_up_after_repeated_conflicts(
+    storage: RedisStorage,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    watch_record = storage._watch_record  # noqa: SLF001
+
+    async def conflicting_watch_record(**kwargs: object) -> StorageRecord:
+        record = await watch_record(**kwargs)  # type: ignore[arg-type]
+        await storage.mark_chats(mailer_id=MAILER_ID, state=ChatState.FAILED, chats=[9])
+        return record
+
+    monkeypatch.setattr(storage, "_watch_record", conflicting_watch_record)
+    with pytest.raises(WatchError):
+        async with storage.update_record(mailer_id=MAILER_ID) as record:
+            record.chats.mark(state=ChatState.SUCCESS, chats=[1])
+
+
+@pytest.mark.parametrize("chat_queue", [False, True])
+async def test_pre_series_record_is_migrated_on_restore(*, chat_queue: bool) -> None:
+    redis = fakeredis.FakeAsyncRedis()
+    legacy = StorageRecord(
+        chats=Chats.from_iterable([1, 2, 3]),
+        content=TextContent(text="hello"),
+        bot_id=42,
+    )
+    await redis.set(f"mailer:{MAILER_ID}", legacy.model_dump_json(exclude_defaults=True))
+    storage = RedisStorage(redis=redis, chat_queue=chat_queue)
+    bot = create_bot()
+    broadcaster = Broadcaster(bot, storage=storage, lazy_restore=True)
+
+    await broadcaster.restore_mailers()
+    mailer = broadcaster[MAILER_ID]
+    assert mailer.status is MailerStatus.STOPPED
+    assert mailer.counters[ChatState.PENDING] == 3
+    assert await mailer.start()
+
+    assert sorted(sent_chats(bot)) == [1, 2, 3]
+    assert not storage._is_legacy(data=await redis.get(f"mailer:{MAILER_ID}"))  # noqa: SLF001
+    await storage.shutdown()
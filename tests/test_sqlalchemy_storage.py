@@ -0,0 +1,71 @@
+from pathlib import Path
+
+import pytest
+
+from aiogram_broadcaster import Broadcaster
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.mailer.chats import Chats, ChatState
+from aiogram_broadcaster.mailer.status import MailerStatus
+from aiogram_broadcaster.storages.base import StorageRecord
+
+
+pytest.importorskip("aiosqlite")
+from sqlalchemy import insert
+
+from aiogram_broadcaster.storages.sqlalchemy import SQLAlchemyStorage
+
+from .conftest import create_bot, sent_chats
+
+
+MAILER_ID = 1
+
+
+@pytest.mark.parametrize("chat_queue", [False, True])
+async def test_pre_series_record_is_migrated_on_restore(
+    tmp_path: Path,
+    *,
+    chat_queue: bool,
+) -> None:
+    url = f"sqlite+aiosqlite:///{tmp_path / 'mailers.db'}"
+    storage = SQLAlchemyStorage.from_url(url=url, chat_queue=chat_queue)
+    await storage.startup()
+    legacy = StorageRecord(
+        chats=Chats.from_iterable([1, 2, 3]),
+        content=TextContent(text="hello"),
+        bot_id=42,
+    )
+    async with storage.session_maker() as session:
+        data = legacy.model_dump_json(exclude_defaults=True)
+        await session.execute(insert(storage.table).values(id=MAILER_ID, data=data))
+        await session.commit()
+    bot = create_bot()
+    broadcaster = Broadcaster(bot, storage=storage, lazy_restore=True)
+
+    await broadcaster.restore_mailers()
+    mailer = broadcaster[MAILER_ID]
+    assert mailer.status is MailerStatus.STOPPED
+    assert mailer.counters[ChatState.PENDING] == 3
+    assert await mailer.start()
+
+    assert sorted(sent_chats(bot)) == [1, 2, 3]
+    assert (await storage.count_chats(mailer_id=MAILER_ID))[ChatState.SUCCESS] == 3
+    await storage.shutdown()
+
+
+async def test_registry_in_content_is_not_mistaken_for_legacy_chats(tmp_path: Path) -> None:
+    url = f"sqlite+aiosqlite:///{tmp_path / 'mailers.db'}"
+    storage = SQLAlchemyStorage.from_url(url=url)
+    await storage.startup()
+    record = StorageRecord(
+        chats=Chats.from_iterable([1, 2, 3]),
+        content=TextContent(text='Open the "registry" page'),
+        bot_id=42,
+        context={"registry": True},
+    )
+    await storage.set_record(mailer_id=MAILER_ID, record=record)
+
+    assert not storage._is_legacy(data=storage._dump_data(record=record))  # noqa: SLF001
+    [(mailer_id, stub)] = [stub async for stub in storage.get_stubs()]
+    assert mailer_id == MAILER_ID
+    assert stub.counters[ChatState.PENDING] == 3
+    await storage.shutdown()
@@ -0,0 +1,27 @@
+from asyncio import gather
+
+from aiogram_broadcaster import Broadcaster
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.utils.exceptions import MailerStartError
+
+from .conftest import StorageFactory, create_bot, sent_chats
+
+
+CHATS = range(1, 51)
+
+
+async def test_concurrent_start_of_stub_runs_once(storage_factory: StorageFactory) -> None:
+    broadcaster = Broadcaster(create_bot(), storage=await storage_factory())
+    mailer = await broadcaster.create_mailer(chats=CHATS, content=TextContent(text="hello"))
+
+    bot = create_bot(delay=0.001)
+    restored = Broadcaster(bot, storage=await storage_factory(), lazy_restore=True)
+    await restored.restore_mailers()
+    stub = restored[mailer.id]
+    assert not stub.hydrated
+
+    results = await gather(stub.start(), stub.start(), return_exceptions=True)
+
+    assert results.count(True) == 1
+    assert any(isinstance(result, MailerStartError) for result in results)
+    assert sorted(sent_chats(bot)) == list(CHATS)
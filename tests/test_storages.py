@@ -0,0 +1,45 @@
+import pytest
+
+from aiogram_broadcaster.contents import TextContent
+from aiogram_broadcaster.mailer.chats import Chats, ChatState
+from aiogram_broadcaster.storages.base import BaseStorage, StorageRecord
+from aiogram_broadcaster.storages.cached import CachedStorage
+
+from .conftest import StorageFactory
+
+
+MAILER_ID = 1
+
+
+@pytest.mark.parametrize("cached", [False, True])
+async def test_update_record_writes_nothing_when_block_raises(
+    storage_factory: StorageFactory,
+    *,
+    cached: bool,
+) -> None:
+    storage: BaseStorage = await storage_factory()
+    if cached:
+        storage = CachedStorage(storage=storage)
+    record = StorageRecord(
+        chats=Chats.from_iterable([1, 2, 3]),
+        content=TextContent(text="hello"),
+        bot_id=42,
+    )
+    await storage.set_record(mailer_id=MAILER_ID, record=record)
+
+    with pytest.raises(RuntimeError):
+        async with storage.update_record(mailer_id=MAILER_ID) as updated:
+            updated.chats.mark(state=ChatState.SUCCESS, chats=[1])
+            updated.concurrency = 2
+            raise RuntimeError
+
+    async with storage.update_record(mailer_id=MAILER_ID) as updated:
+        updated.chats.mark(state=ChatState.FAILED, chats=[2])
+
+    stored = await storage.get_record(mailer_id=MAILER_ID)
+    assert stored.chats.counters == {
+        ChatState.PENDING: 2,
+        ChatState.FAILED: 1,
+        ChatState.SUCCESS: 0,
+    }
+    assert stored.concurrency == 1